@@ -1,17 +1,42 @@
 import asyncio
+import hashlib
 import os
-from typing import List, Dict, Any, Optional
-from tempfile import TemporaryDirectory
+import time
+from typing import List, Dict, Any, Optional, Callable, Awaitable, AsyncIterator
+from bson import ObjectId
 from fastapi import UploadFile
 
+from app.core.config import settings
 from app.services.adk import ADKClient
 from app.services.vertex_ai import VertexAIClient
-from app.services.pdf_tools import save_pdf_stream_to_db, save_pdf_file_to_db, generate_pdf_report
+from app.services.pdf_tools import save_document_with_extraction, save_pdf_bytes_to_db, get_document_hashes
+from app.services.audit_findings import audit_findings
+from app.services.audit_store import audit_store, result_version
+from app.services.report_store import report_store
 from app.infrastructure.db import mongodb
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
-from app.agents.sub_agents.compliance_scanner import ComplianceScannerAgent
+from app.infrastructure.logger import Logger
+from app.agents.sub_agents.compliance_scanner import ComplianceScannerAgent, issue_key
 from app.agents.sub_agents.remediation_suggestor import RemediationSuggestorAgent
-from app.agents.sub_agents.report_generator import ReportGeneratorAgent
+from app.agents.sub_agents.report_generator import ReportGeneratorAgent, REPORT_FORMATS, REPORT_LAYOUT_VERSION, report_url
+
+logger = Logger(__name__)
+
+# Awaited with (event, data) as an audit progresses; see AuditOrchestrator.audit_documents
+ProgressCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+SEVERITY_WEIGHTS = {
+    "High": 30,
+    "Medium": 10,
+    "Low": 5
+}
+
+def score_issues(issues: List[Dict[str, Any]]) -> int:
+    """Compliance score: 100 minus a per-severity deduction for each issue, floored at 0."""
+    score = 100
+    for issue in issues:
+        severity = issue.get("severity", "Low")
+        score -= SEVERITY_WEIGHTS.get(severity, 5)
+    return max(0, score)
 
 class AuditOrchestrator:
     def __init__(self, vertex_ai: VertexAIClient, adk: ADKClient):
@@ -21,6 +46,21 @@ class AuditOrchestrator:
         self.scanner = ComplianceScannerAgent(vertex_ai, adk)
         self.remediator = RemediationSuggestorAgent(vertex_ai, adk)
         self.reporter = ReportGeneratorAgent()
+        # Inputs besides the documents that decide an incremental audit's findings
+        self.findings_version = self._findings_version()
+        self.findings_model = adk.model if adk.backend.is_live else f"{adk.backend.mode}:{adk.model}"
+
+    def _findings_version(self) -> str:
+        """Hash of the scanner and remediation prompts and scan mode; changes whenever they do."""
+        material = "\0".join([
+            self.scanner.prompt_template,
+            self.scanner.inline_prompt_template,
+            self.scanner.retrieval_prompt_template,
+            self.remediator.prompt_template,
+            self.remediator.batch_prompt_template,
+            settings.SCANNER_MODE,
+        ])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
 
     async def _remediate_issue(self, issue: Dict[str, Any], user_id: str, session_id: str) -> Dict[str, Any]:
         """Helper coroutine to get a recommendation for a single issue."""
@@ -28,39 +68,270 @@ class AuditOrchestrator:
         issue['recommendation'] = recommendation
         return issue
 
+    async def _remediate_batch(self, issues: List[Dict[str, Any]], user_id: str, session_id: str) -> List[Dict[str, Any]]:
+        """
+        Helper coroutine to get recommendations for a group of issues in one LLM call.
+        Issues whose recommendation could not be parsed fall back to single-issue calls.
+        """
+        if len(issues) == 1:
+            return [await self._remediate_issue(issues[0], user_id, session_id)]
+
+        recommendations = await self.remediator.get_recommendations_batch(issues, user_id, session_id)
+        fallback_tasks = []
+        for index, issue in enumerate(issues):
+            if index in recommendations:
+                issue['recommendation'] = recommendations[index]
+            else:
+                fallback_tasks.append(self._remediate_issue(issue, user_id, session_id))
+        if fallback_tasks:
+            await asyncio.gather(*fallback_tasks)
+        return issues
+
+    async def upload_documents(self, documents: List[UploadFile], user_id: str, extract: bool = True) -> List[str]:
+        """Uploads the audit documents to GridFS, extracting their text in the same pipelined step."""
+        upload_tasks = [save_document_with_extraction(mongodb.db, doc.file, doc.filename, {"user_id": user_id, "type": "uploaded"}, extract=extract) for doc in documents]
+        return list(await asyncio.gather(*upload_tasks))
+
     async def run_audit(self, audit_type: str, company_name: str, audit_scope: str, control_families: list, documents: List[UploadFile], user_id: str, session_id: str, project_id: Optional[str] = None):
-        # 1. Stream files to GridFS and get their unique IDs
-        upload_tasks = [save_pdf_stream_to_db(mongodb.db, doc.file, doc.filename, {"user_id": user_id, "type": "uploaded"}) for doc in documents]
-        doc_ids = await asyncio.gather(*upload_tasks)
+        # 1. Upload files to GridFS and extract their text in the same pipelined step
+        doc_ids = await self.upload_documents(documents, user_id)
+        return await self.audit_documents(audit_type, company_name, audit_scope, control_families, doc_ids, user_id, session_id, project_id)
 
-        # 2. Concurrently fan-out remediation tasks as issues are streamed from the scanner
+    async def audit_documents(
+        self,
+        audit_type: str,
+        company_name: str,
+        audit_scope: str,
+        control_families: list,
+        doc_ids: List[str],
+        user_id: str,
+        session_id: str,
+        project_id: Optional[str] = None,
+        progress: Optional[ProgressCallback] = None,
+        checkpoint: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Runs the scan, remediation and report stages on documents already in GridFS.
+        `progress` is awaited with ("stage", {"stage": ...}) as each stage starts and with
+        ("checkpoint", state) after each stage completes; passing the latest state back as
+        `checkpoint` resumes the audit without repeating the completed stages. While scanning it
+        also gets ("issue", issue) per issue found, ("score", ...) with the running score and
+        ("recommendation", ...) as each remediation finishes; issues carry an `index` to match them.
+        """
+        checkpoint = dict(checkpoint or {})
+        timings = dict(checkpoint.get("timings", {}))
+
+        async def emit(event: str, data: Dict[str, Any]):
+            if progress is not None:
+                await progress(event, data)
+
+        if "issues" in checkpoint:
+            enriched_issues = checkpoint["issues"]
+        else:
+            await emit("stage", {"stage": "scanning"})
+            started = time.perf_counter()
+            enriched_issues = await self._scan_and_remediate(audit_type, company_name, audit_scope, control_families, doc_ids, user_id, session_id, project_id, emit)
+            timings["scan_seconds"] = round(time.perf_counter() - started, 3)
+            checkpoint["issues"] = enriched_issues
+            checkpoint["timings"] = timings
+            await emit("checkpoint", dict(checkpoint))
+
+        await emit("stage", {"stage": "reporting"})
+        started = time.perf_counter()
+        result = await self._build_report(enriched_issues, company_name, user_id, project_id, checkpoint, emit)
+        timings["report_seconds"] = round(time.perf_counter() - started, 3)
+
+        # 6. Persist the structured result; reports are rendered from it
+        result["audit_id"] = await audit_store.save(
+            audit_id=checkpoint["audit_id"],
+            pdf_id=checkpoint.get("pdf_id"),
+            pdf_url=result["pdf_url"],
+            user_id=user_id,
+            project_id=project_id,
+            company_name=company_name,
+            audit_type=audit_type,
+            audit_scope=audit_scope,
+            control_families=control_families,
+            doc_ids=doc_ids,
+            score=result["score"],
+            issues=enriched_issues,
+            timings=timings,
+            models={
+                "model": self.adk.model,
+                "llm_backend": self.adk.backend.mode,
+                "findings_version": self.findings_version,
+                "scanner_mode": settings.SCANNER_MODE,
+                "scanner_fanout": settings.SCANNER_FANOUT,
+            }
+        )
+        return result
+
+    async def _scan_and_remediate(self, audit_type: str, company_name: str, audit_scope: str, control_families: list, doc_ids: List[str], user_id: str, session_id: str, project_id: Optional[str], emit: ProgressCallback) -> List[Dict[str, Any]]:
+        if settings.AUDIT_INCREMENTAL:
+            return await self._scan_incremental(audit_type, company_name, audit_scope, control_families, doc_ids, user_id, session_id, project_id, emit)
+        issues = self.scanner.stream_issues(audit_type, company_name, audit_scope, control_families, doc_ids, user_id, session_id, project_id)
+        return await self._remediate_stream(issues, user_id, session_id, emit)
+
+    async def _remediate_stream(self, issues: AsyncIterator[Dict[str, Any]], user_id: str, session_id: str, emit: ProgressCallback) -> List[Dict[str, Any]]:
+        """
+        Remediates issues as they arrive and returns them enriched, in the order found.
+        Duplicates and scanner errors are dropped; issues that already carry a
+        recommendation (reused findings) skip remediation.
+        """
+        async def remediate(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            enriched_batch = await self._remediate_batch(batch, user_id, session_id)
+            for issue in enriched_batch:
+                await emit("recommendation", {"index": issue["index"], "recommendation": issue.get("recommendation")})
+            return enriched_batch
+
+        # 2. Concurrently fan-out remediation tasks as issues are streamed from the scanner.
+        #    Issues are packed into size-bounded batches so each batch costs a single LLM call;
+        #    a partial batch is sent once its first issue has waited REMEDIATION_BATCH_MAX_WAIT_SECONDS,
+        #    so remediation overlaps the scan even when the scanner is slow or idle.
+        batch_size = max(1, settings.REMEDIATION_BATCH_SIZE)
+        max_wait = max(0.0, settings.REMEDIATION_BATCH_MAX_WAIT_SECONDS)
         remediation_tasks = []
-        async for issue in self.scanner.stream_issues(audit_type, company_name, audit_scope, control_families, doc_ids, user_id, session_id, project_id):
-            if "error" not in issue:
-                # Create a task for each issue and add it to the list
-                task = asyncio.create_task(self._remediate_issue(issue, user_id, session_id))
-                remediation_tasks.append(task)
+        found, reused = [], []
+        seen = set()
+        batch, batch_chars, batch_deadline = [], 0, None
+        loop = asyncio.get_running_loop()
+
+        # The scanner stream is read in its own task so a deadline can fire between issues
+        queue: asyncio.Queue = asyncio.Queue()
+        end = object()
+
+        async def pump():
+            try:
+                async for issue in issues:
+                    queue.put_nowait(issue)
+            except Exception as e:
+                queue.put_nowait(e)
+            queue.put_nowait(end)
+
+        def flush():
+            nonlocal batch, batch_chars, batch_deadline
+            if batch:
+                remediation_tasks.append(asyncio.create_task(remediate(batch)))
+            batch, batch_chars, batch_deadline = [], 0, None
+
+        pump_task = asyncio.create_task(pump())
+        getter = None
+        try:
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(queue.get())
+                timeout = None if batch_deadline is None else max(0.0, batch_deadline - loop.time())
+                ready, _ = await asyncio.wait({getter}, timeout=timeout)
+                if not ready:
+                    flush()
+                    continue
+                issue, getter = getter.result(), None
+                if issue is end:
+                    break
+                if isinstance(issue, Exception):
+                    raise issue
+                if "error" in issue:
+                    continue
+                key = issue_key(issue)
+                if key in seen:
+                    continue
+                seen.add(key)
+                issue["index"] = len(found)
+                found.append(issue)
+                await emit("issue", dict(issue))
+                await emit("score", {"score": score_issues(found), "issues_found": len(found)})
+                if issue.get("recommendation") is not None:
+                    reused.append(issue)
+                    await emit("recommendation", {"index": issue["index"], "recommendation": issue["recommendation"]})
+                    continue
+                batch.append(issue)
+                batch_chars += len(str(issue.get("description", "")))
+                if batch_deadline is None:
+                    batch_deadline = loop.time() + max_wait
+                if len(batch) >= batch_size or batch_chars >= settings.REMEDIATION_BATCH_MAX_CHARS:
+                    flush()
+            flush()
+        except BaseException:
+            # Cancelled (e.g. a streaming client went away): stop the scan and the remediations already started
+            pump_task.cancel()
+            if getter is not None:
+                getter.cancel()
+            for task in remediation_tasks:
+                task.cancel()
+            raise
         
         # 3. Aggregate results once all remediation tasks are complete
-        if not remediation_tasks:
-            # Handle case where no issues were found
-            enriched_issues = []
-        else:
-            enriched_issues = await asyncio.gather(*remediation_tasks)
+        enriched_batches = await asyncio.gather(*remediation_tasks) if remediation_tasks else []
+        enriched_issues = reused + [issue for enriched_batch in enriched_batches for issue in enriched_batch]
+        return sorted(enriched_issues, key=lambda issue: issue["index"])
 
-        # 4. Perform final sequential steps: scoring and report section generation
-        severity_weights = {
-            "High": 30,
-            "Medium": 10,
-            "Low": 5
+    async def _scan_incremental(self, audit_type: str, company_name: str, audit_scope: str, control_families: list, doc_ids: List[str], user_id: str, session_id: str, project_id: Optional[str], emit: ProgressCallback) -> List[Dict[str, Any]]:
+        """
+        Scans per (document, control family) pair, reusing the cached remediated findings of every
+        pair whose fingerprint is unchanged and caching the findings of the pairs scanned now.
+        """
+        families = list(control_families) if isinstance(control_families, (list, tuple)) else [control_families]
+        doc_ids = [str(doc_id) for doc_id in doc_ids]
+        hashes = await get_document_hashes(mongodb.db, doc_ids)
+        context = {"audit_type": audit_type, "company_name": company_name, "audit_scope": audit_scope}
+        fingerprints = {
+            (doc_id, family): audit_findings.fingerprint(hashes[doc_id], family, context, self.findings_version, self.findings_model)
+            for doc_id in doc_ids if doc_id in hashes
+            for family in families
         }
-        
-        score = 100
-        for issue in enriched_issues:
-            severity = issue.get("severity", "Low") 
-            score -= severity_weights.get(severity, 5)
+        cached = await audit_findings.get_many(list(fingerprints.values()))
+        pending = [(doc_id, family) for doc_id in doc_ids for family in families if fingerprints.get((doc_id, family)) not in cached]
+        logger.info(f"Incremental audit: reusing {len(families) * len(doc_ids) - len(pending)} document/family pairs, scanning {len(pending)}")
+
+        scanned = {pair: [] for pair in pending}
+        failed = set()
 
-        score = max(0, score)
+        async def issues() -> AsyncIterator[Dict[str, Any]]:
+            for (doc_id, family), fingerprint in fingerprints.items():
+                if fingerprint in cached:
+                    for issue in cached[fingerprint]["issues"]:
+                        yield {**issue, "control_family": family, "document_id": doc_id}
+            if not pending:
+                return
+            shards = [([family], [doc_id]) for doc_id, family in pending]
+            async for issue in self.scanner.stream_issues(
+                audit_type, company_name, audit_scope, families, doc_ids, user_id, session_id, project_id,
+                shards=shards, dedupe=False
+            ):
+                if "error" in issue:
+                    if "doc_ids" in issue:
+                        failed.update((doc_id, family) for doc_id in issue["doc_ids"] for family in issue.get("control_families", []))
+                    else:
+                        failed.update(pending)
+                    continue
+                scanned.setdefault((issue.get("document_id"), issue.get("control_family")), []).append(issue)
+                yield issue
+
+        enriched_issues = await self._remediate_stream(issues(), user_id, session_id, emit)
+
+        # Duplicates were remediated once; every pair that reported one stores its recommendation
+        recommendations = {issue_key(issue): issue.get("recommendation") for issue in enriched_issues}
+        store_tasks = [
+            audit_findings.store(
+                fingerprints[pair],
+                hashes[pair[0]],
+                pair[1],
+                self.findings_version,
+                self.findings_model,
+                [
+                    {"severity": issue.get("severity"), "description": issue.get("description"), "recommendation": recommendations.get(issue_key(issue))}
+                    for issue in scanned[pair]
+                ]
+            )
+            for pair in pending
+            if pair in fingerprints and pair not in failed
+        ]
+        await asyncio.gather(*store_tasks)
+        return enriched_issues
+
+    async def _build_report(self, enriched_issues: List[Dict[str, Any]], company_name: str, user_id: str, project_id: Optional[str], checkpoint: Dict[str, Any], emit: ProgressCallback) -> Dict[str, Any]:
+        # 4. Perform final sequential steps: scoring and report section generation
+        score = score_issues(enriched_issues)
         
         # Determine overall severity for report coloring
         severities = {issue.get("severity") for issue in enriched_issues}
@@ -73,72 +344,77 @@ class AuditOrchestrator:
         else:
             overall_severity = "None"
 
-        report_sections = []
-        for issue in enriched_issues:
-            report_sections.append({
-                "title": f"Issue: {issue.get('description', 'N/A')}",
-                "content": f"Severity: {issue.get('severity', 'N/A')}\n\nRecommendation: {issue.get('recommendation', 'N/A')}",
-                "flagged": True
-            })
-        if not enriched_issues:
-            report_sections.append({
-                "title": "No Compliance Issues Found",
-                "content": "Based on the provided documents and control families, no compliance gaps were identified.",
-                "flagged": False
-            })
-
-        # 5. Generate and save the final PDF report
-        pdf_url = None
-        with TemporaryDirectory() as tmpdir:
-            pdf_path = self.reporter.create_pdf_report(
-                score=score, 
-                issues=enriched_issues, 
-                sections=report_sections, 
-                overall_severity=overall_severity,
-                output_dir=tmpdir
-            )
-            pdf_id = await save_pdf_file_to_db(
-                mongodb.db,
-                pdf_path,
-                f"audit_report_{user_id}.pdf",
-                metadata={
-                    "user_id": str(user_id), 
-                    "type": "generated",
-                    "score": score,
-                    "company_name": company_name,
-                    "project_id": project_id
-                }
-            )
+        report_sections = self.reporter.build_sections(enriched_issues)
+
+        # 5. Fix the audit id up front so a resumed audit saves the same entry
+        if "audit_id" not in checkpoint:
+            checkpoint["audit_id"] = str(ObjectId())
+            await emit("checkpoint", dict(checkpoint))
+        audit_id = checkpoint["audit_id"]
+
+        # Render the PDF now only in eager mode; otherwise each format is rendered on first request.
+        # Either way pdf_url keeps the /audit/pdf/{id} form clients parse: serve_pdf accepts an audit id
+        if settings.REPORT_RENDER_MODE == "eager":
+            pdf_id = checkpoint.get("pdf_id")
+            if pdf_id is None:
+                # Once: a resumed audit reuses the saved one
+                pdf_id = await self._save_report_pdf(audit_id, score, enriched_issues, report_sections, overall_severity, company_name, user_id, project_id)
+                checkpoint["pdf_id"] = pdf_id
+                await emit("checkpoint", dict(checkpoint))
             pdf_url = f"/api/v1/audit/pdf/{pdf_id}"
+        else:
+            pdf_url = f"/api/v1/audit/pdf/{audit_id}"
         
         return {
             "score": score,
             "issues": enriched_issues,
             "report_sections": report_sections,
             "pdf_url": pdf_url,
+            "report_urls": {report_format: report_url(audit_id, report_format) for report_format in REPORT_FORMATS},
         }
 
-    async def get_history(self, user_id: str) -> List[Dict[str, Any]]:
+    async def _save_report_pdf(self, audit_id: str, score: int, enriched_issues: List[Dict[str, Any]], report_sections: List[Dict[str, Any]], overall_severity: str, company_name: str, user_id: str, project_id: Optional[str]) -> str:
+        # Rendered in memory and uploaded chunk by chunk; nothing touches local disk
+        pdf_bytes = await self.reporter.render_pdf_report(
+            score=score, 
+            issues=enriched_issues, 
+            sections=report_sections, 
+            overall_severity=overall_severity
+        )
+        return await save_pdf_bytes_to_db(
+            mongodb.db,
+            pdf_bytes,
+            f"audit_report_{user_id}.pdf",
+            metadata={
+                "user_id": str(user_id), 
+                "type": "generated",
+                "score": score,
+                "company_name": company_name,
+                "project_id": project_id,
+                # Registers the PDF as the cached rendering of this result (see ReportStore)
+                "audit_id": audit_id,
+                "format": "pdf",
+                "result_version": result_version(score, enriched_issues),
+                "layout_version": REPORT_LAYOUT_VERSION,
+            }
+        )
+
+    async def get_report(self, audit: Dict[str, Any], report_format: str) -> str:
+        """
+        Returns the GridFS id of a stored audit's report in one of REPORT_FORMATS,
+        rendering and caching it on first request.
+        """
+        extension = REPORT_FORMATS[report_format][1]
+        return await report_store.materialize(
+            audit,
+            report_format,
+            REPORT_LAYOUT_VERSION,
+            f"audit_report_{audit['_id']}.{extension}",
+            lambda: self.reporter.render(audit, report_format)
+        )
+
+    async def get_history(self, user_id: str, project_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
-        Retrieves a list of all past audit reports for a given user.
+        Retrieves a list of all past audit reports for a given user, optionally for one project.
         """
-        fs = AsyncIOMotorGridFSBucket(mongodb.db)
-        # Find all files generated by this user. Query user_id as a string for consistency.
-        cursor = fs.find({
-            "metadata.user_id": str(user_id),
-            "metadata.type": "generated"
-        }).sort("uploadDate", -1) # Sort by most recent first
-
-        history_items = []
-        for doc in await cursor.to_list(length=None):
-            # Correctly access all data using dictionary keys, not attributes.
-            metadata = doc.get("metadata", {})
-            history_items.append({
-                "audit_id": str(doc.get("_id")),
-                "company_name": metadata.get("company_name", "N/A"),
-                "run_date": doc.get("uploadDate").strftime("%Y-%m-%d %H:%M:%S"),
-                "score": metadata.get("score", "N/A"),
-                "pdf_url": f"/api/v1/audit/pdf/{doc.get('_id')}",
-                "project_id": metadata.get("project_id")
-            })
-        return history_items 
\ No newline at end of file
+        return await audit_store.history(str(user_id), project_id)
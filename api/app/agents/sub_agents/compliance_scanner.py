@@ -1,14 +1,23 @@
 import asyncio
-import json
 import re
 import os
-from typing import AsyncGenerator, Dict, Any
+from typing import AsyncGenerator, Dict, Any, List, Optional, Tuple
+from app.core.config import settings
 from app.services.adk import ADKClient
 from app.services.vertex_ai import VertexAIClient
-from app.services.pdf_tools import extract_pdf_content
+from app.services.pdf_tools import extract_pdf_content, get_document_sizes
+from app.services.retrieval import BM25Index, build_audit_index
+from app.services.json_stream import JSONArrayStreamParser
 from app.infrastructure.db import mongodb
+from app.infrastructure.logger import Logger
 from bson import ObjectId
 
+logger = Logger(__name__)
+
+def issue_key(issue: Dict[str, Any]) -> str:
+    """Normalized description used to drop the same gap reported more than once."""
+    return re.sub(r"[^a-z0-9]+", " ", str(issue.get("description", "")).lower()).strip()
+
 class ComplianceScannerAgent:
     def __init__(self, vertex_ai: VertexAIClient, adk: ADKClient):
         self.vertex_ai = vertex_ai
@@ -27,18 +36,89 @@ class ComplianceScannerAgent:
 
         self.tools = [get_document_content]
         self.prompt_template = self._load_prompt_template()
+        self.inline_prompt_template = self._load_prompt_template('compliance_scanner_inline_prompt.txt')
+        self.retrieval_prompt_template = self._load_prompt_template('compliance_scanner_retrieval_prompt.txt')
 
-    def _load_prompt_template(self) -> str:
+    def _load_prompt_template(self, filename: str = 'compliance_scanner_prompt.txt') -> str:
         """Loads the prompt template from the file system."""
         try:
             # Navigate from 'sub_agents' up to 'agents' and then down to 'prompts'
             dir_path = os.path.dirname(os.path.realpath(__file__))
-            prompt_path = os.path.join(dir_path, '..', 'prompts', 'compliance_scanner_prompt.txt')
+            prompt_path = os.path.join(dir_path, '..', 'prompts', filename)
             with open(prompt_path, 'r') as f:
                 return f.read()
         except FileNotFoundError:
             return "Error: Scanner prompt template not found."
 
+    async def _fetch_documents(self, doc_ids: list) -> List[str]:
+        """Pre-fetches the extracted text of every document concurrently."""
+        return await asyncio.gather(*[extract_pdf_content(mongodb.db, ObjectId(str(doc_id))) for doc_id in doc_ids])
+
+    async def _prepare_scan(self, shards: List[Tuple[list, list]], doc_ids: list, scan_mode: str) -> Tuple[str, Optional[Dict[str, str]], Optional[BM25Index]]:
+        """
+        Resolves the scan mode once per audit and loads what its shards share: the document
+        text for "inline", the BM25 index for "retrieval". Returns (mode, texts by document id, index).
+        "inline" and "auto" inline only when the largest shard's documents fit
+        SCANNER_INLINE_TOKEN_BUDGET, estimated from cached extractions and file sizes so nothing
+        is parsed just to be measured; larger scans fall back to retrieval (tool mode without
+        the retrieval prompt), which keeps the prompt size independent of the documents' size.
+        """
+        if scan_mode in ("inline", "auto") and "Error" not in self.inline_prompt_template:
+            sizes = await get_document_sizes(mongodb.db, doc_ids)
+            # Each shard embeds only its own documents
+            estimated_tokens = max(sum(sizes.get(str(doc_id), 0) for doc_id in shard_doc_ids) for _, shard_doc_ids in shards) // 4
+            if estimated_tokens <= settings.SCANNER_INLINE_TOKEN_BUDGET:
+                texts = await self._fetch_documents(doc_ids)
+                return "inline", {str(doc_id): text for doc_id, text in zip(doc_ids, texts)}, None
+            if scan_mode == "inline":
+                logger.warning(
+                    f"Inline scan of ~{estimated_tokens} tokens exceeds SCANNER_INLINE_TOKEN_BUDGET "
+                    f"({settings.SCANNER_INLINE_TOKEN_BUDGET}); falling back to a smaller prompt"
+                )
+        if scan_mode in ("retrieval", "inline", "auto") and "Error" not in self.retrieval_prompt_template:
+            return "retrieval", None, await build_audit_index(mongodb.db, [str(doc_id) for doc_id in doc_ids])
+        return "tool", None, None
+
+    @staticmethod
+    def _inline_documents(doc_ids: list, texts: Dict[str, str]) -> str:
+        """Returns the documents section for an inline-mode prompt."""
+        return "\n\n".join(
+            f"--- Document {doc_id} ---\n{texts[str(doc_id)]}"
+            for doc_id in doc_ids
+        )
+
+    @staticmethod
+    def _retrieve_evidence(index: BM25Index, doc_ids: list, control_families) -> str:
+        """
+        Returns the evidence section for a retrieval-mode prompt: the top SCANNER_RETRIEVAL_TOP_K
+        BM25 passages of the given documents per control family.
+        """
+        families = control_families if isinstance(control_families, (list, tuple)) else [control_families]
+        doc_ids = {str(doc_id) for doc_id in doc_ids}
+        sections = []
+        for family in families:
+            passages = index.search(str(family), settings.SCANNER_RETRIEVAL_TOP_K, doc_ids=doc_ids)
+            lines = [f"### {family}"]
+            if passages:
+                lines.extend(
+                    f"--- Document {passage['doc_id']}, passage {passage['chunk'] + 1} ---\n{passage['text']}"
+                    for passage in passages
+                )
+            else:
+                lines.append("No relevant passages found.")
+            sections.append("\n".join(lines))
+        return "\n\n".join(sections)
+
+    @staticmethod
+    def _plan_shards(control_families, doc_ids: list, fanout: str) -> List[Tuple[list, list]]:
+        """Splits a scan into (control_families, doc_ids) shards according to SCANNER_FANOUT."""
+        families = list(control_families) if isinstance(control_families, (list, tuple)) else [control_families]
+        if fanout == "family" and len(families) > 1:
+            return [([family], doc_ids) for family in families]
+        if fanout == "family_document" and len(families) * len(doc_ids) > 1:
+            return [([family], [doc_id]) for family in families for doc_id in doc_ids]
+        return [(control_families, doc_ids)]
+
     async def stream_issues(
         self,
         audit_type: str,
@@ -48,45 +128,158 @@ class ComplianceScannerAgent:
         doc_ids: list,
         user_id: str,
         session_id: str,
-        project_id: str = None
+        project_id: str = None,
+        scan_mode: Optional[str] = None,
+        fanout: Optional[str] = None,
+        shards: Optional[List[Tuple[list, list]]] = None,
+        dedupe: bool = True
     ) -> AsyncGenerator[Dict[str, Any], None]:
-        
+        """
+        Scans the documents and yields one issue dict per compliance gap.
+        `scan_mode` (default SCANNER_MODE): "inline" embeds all document text in the prompt,
+        "retrieval" embeds only the passages most relevant to each control family, "tool" lets
+        the model read documents through `get_document_content`, and "auto" inlines when the
+        documents fit SCANNER_INLINE_TOKEN_BUDGET and falls back to retrieval otherwise (as does
+        "inline" when they do not fit; see _prepare_scan).
+        The mode is resolved, and document text or the retrieval index loaded, once per call.
+        `fanout` (default SCANNER_FANOUT): "none" makes one call for everything, "family" runs one
+        scan per control family and "family_document" one per family and document. An inline
+        "family" shard embeds every document again, a "family_document" shard only its own.
+        Shards run concurrently (SCANNER_SHARD_CONCURRENCY), duplicate issues are dropped, and a failed
+        shard yields an error dict while the other shards' issues are kept.
+        Explicit `shards` ((control_families, doc_ids) pairs) replace the fan-out plan. Issues from
+        a single-family or single-document shard are tagged with `control_family` / `document_id`,
+        and shard errors carry the shard's `control_families` and `doc_ids`.
+        """
         if "Error" in self.prompt_template:
             yield {"error": self.prompt_template}
             return
 
-        prompt = self.prompt_template.format(
-            audit_type=audit_type,
-            company_name=company_name,
-            audit_scope=audit_scope,
-            control_families=control_families,
-            doc_ids=[str(doc_id) for doc_id in doc_ids]
-        )
+        explicit = shards is not None
+        if explicit and not shards:
+            return
+        if not explicit:
+            shards = self._plan_shards(control_families, doc_ids, fanout or settings.SCANNER_FANOUT)
+        # Explicit shards may cover only some of the documents (e.g. an incremental re-audit)
+        scan_doc_ids = list(dict.fromkeys(doc_id for _, shard_doc_ids in shards for doc_id in shard_doc_ids))
+        scan_mode, texts, index = await self._prepare_scan(shards, scan_doc_ids, scan_mode or settings.SCANNER_MODE)
+        if len(shards) == 1 and not explicit:
+            async for issue in self._scan_shard(audit_type, company_name, audit_scope, control_families, doc_ids, user_id, session_id, scan_mode, texts, index):
+                yield issue
+            return
+
+        semaphore = asyncio.Semaphore(max(1, settings.SCANNER_SHARD_CONCURRENCY))
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def run_shard(shard_index: int, shard_families: list, shard_doc_ids: list):
+            try:
+                async with semaphore:
+                    # Shards run concurrently, so each keeps its own conversation history
+                    async for issue in self._scan_shard(
+                        audit_type, company_name, audit_scope, shard_families, shard_doc_ids,
+                        user_id, f"{session_id}:scan-{shard_index}", scan_mode, texts, index
+                    ):
+                        if "error" in issue:
+                            issue.setdefault("control_families", shard_families)
+                            issue.setdefault("doc_ids", [str(doc_id) for doc_id in shard_doc_ids])
+                        else:
+                            if len(shard_families) == 1:
+                                issue.setdefault("control_family", shard_families[0])
+                            if len(shard_doc_ids) == 1:
+                                issue.setdefault("document_id", str(shard_doc_ids[0]))
+                        await queue.put(issue)
+            except Exception as e:
+                logger.error(f"Scanner shard {shard_families} failed: {e}")
+                await queue.put({
+                    "error": f"Scanner shard {shard_families} failed: {e}",
+                    "control_families": shard_families,
+                    "doc_ids": [str(doc_id) for doc_id in shard_doc_ids],
+                })
+            finally:
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(run_shard(shard_index, *shard)) for shard_index, shard in enumerate(shards)]
+        seen = set()
+        remaining = len(tasks)
+        try:
+            while remaining:
+                issue = await queue.get()
+                if issue is None:
+                    remaining -= 1
+                    continue
+                if dedupe and "error" not in issue:
+                    key = issue_key(issue)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                yield issue
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _scan_shard(
+        self,
+        audit_type: str,
+        company_name: str,
+        audit_scope: str,
+        control_families: list,
+        doc_ids: list,
+        user_id: str,
+        session_id: str,
+        scan_mode: str,
+        texts: Optional[Dict[str, str]] = None,
+        index: Optional[BM25Index] = None
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """Runs one scanner call over the given control families and documents in a resolved mode (see _prepare_scan)."""
+        if scan_mode == "inline":
+            prompt = self.inline_prompt_template.format(
+                audit_type=audit_type,
+                company_name=company_name,
+                audit_scope=audit_scope,
+                control_families=control_families,
+                documents=self._inline_documents(doc_ids, texts)
+            )
+            tools = []
+        elif scan_mode == "retrieval":
+            prompt = self.retrieval_prompt_template.format(
+                audit_type=audit_type,
+                company_name=company_name,
+                audit_scope=audit_scope,
+                control_families=control_families,
+                evidence=self._retrieve_evidence(index, doc_ids, control_families)
+            )
+            tools = []
+        else:
+            prompt = self.prompt_template.format(
+                audit_type=audit_type,
+                company_name=company_name,
+                audit_scope=audit_scope,
+                control_families=control_families,
+                doc_ids=[str(doc_id) for doc_id in doc_ids]
+            )
+            tools = self.tools
         
         agent_input = {"prompt": prompt}
         instruction = "You are an AI Compliance Analyst. Follow the prompt and return only the requested JSON."
 
-        adk_result = await self.adk.run_agent(
+        # Parse the reply as it streams so each issue is yielded as soon as it is complete
+        parser = JSONArrayStreamParser("issues")
+        async for chunk in self.adk.stream_agent(
             agent_name="compliance_scanner",
             data=agent_input,
             instruction=instruction,
             user_id=user_id,
             session_id=session_id,
-            tools=self.tools
-        )
-
-        if adk_result and adk_result.get("result"):
-            raw_response = adk_result.get("result")
-            # Use regex to robustly find the JSON block, even with markdown backticks
-            json_match = re.search(r'```json\s*(\{.*?\})\s*```', raw_response, re.DOTALL)
-            json_str = json_match.group(1) if json_match else raw_response
-            
-            try:
-                parsed_json = json.loads(json_str)
-                issues = parsed_json.get("issues", [])
-                for issue in issues:
+            tools=tools
+        ):
+            for issue in parser.feed(chunk):
+                if isinstance(issue, dict):
                     yield issue
-            except json.JSONDecodeError:
-                yield {"error": "Failed to parse JSON from scanner", "raw_response": raw_response}
-        else:
+
+        raw_response = parser.buffer
+        if not raw_response:
             yield {"error": "No result from ADK agent"}
+        elif not parser.found:
+            yield {"error": "Failed to parse JSON from scanner", "raw_response": raw_response}
+        elif not parser.done:
+            yield {"error": "Scanner reply ended before the issues list was complete", "raw_response": raw_response}
@@ -2,7 +2,7 @@ import asyncio
 import json
 import re
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List
 from app.services.adk import ADKClient
 from app.services.vertex_ai import VertexAIClient
 
@@ -11,12 +11,13 @@ class RemediationSuggestorAgent:
         self.vertex_ai = vertex_ai
         self.adk = adk
         self.prompt_template = self._load_prompt_template()
+        self.batch_prompt_template = self._load_prompt_template('remediation_batch_prompt.txt')
 
-    def _load_prompt_template(self) -> str:
+    def _load_prompt_template(self, filename: str = 'remediation_suggestor_prompt.txt') -> str:
         """Loads the prompt template from the file system."""
         try:
             dir_path = os.path.dirname(os.path.realpath(__file__))
-            prompt_path = os.path.join(dir_path, '..', 'prompts', 'remediation_suggestor_prompt.txt')
+            prompt_path = os.path.join(dir_path, '..', 'prompts', filename)
             with open(prompt_path, 'r') as f:
                 return f.read()
         except FileNotFoundError:
@@ -60,3 +61,56 @@ class RemediationSuggestorAgent:
                 return f"Error parsing remediation JSON: {raw_response}"
         
         return "No recommendation received from ADK agent."
+
+    async def get_recommendations_batch(
+        self,
+        issues: List[Dict[str, Any]],
+        user_id: str,
+        session_id: str
+    ) -> Dict[int, str]:
+        """
+        Gets recommendations for several issues with a single LLM call.
+        Returns a mapping of position in `issues` -> recommendation. Issues missing from the
+        mapping could not be parsed and should be retried with `get_recommendation`.
+        """
+        if not issues or "Error" in self.batch_prompt_template:
+            return {}
+
+        issue_lines = "\n".join(
+            f"{index}. [Severity: {issue.get('severity', 'N/A')}] {issue.get('description', 'N/A')}"
+            for index, issue in enumerate(issues)
+        )
+        prompt = self.batch_prompt_template.format(issues=issue_lines)
+        instruction = "You are an AI Remediation Specialist. Follow the prompt and return only the requested JSON."
+
+        adk_result = await self.adk.run_agent(
+            agent_name="remediation_suggestor",
+            data={"prompt": prompt},
+            instruction=instruction,
+            user_id=user_id,
+            session_id=session_id
+        )
+
+        if not (adk_result and adk_result.get("result")):
+            return {}
+
+        raw_response = adk_result.get("result")
+        json_match = re.search(r'```json\s*(\{.*?\})\s*```', raw_response, re.DOTALL)
+        json_str = json_match.group(1) if json_match else raw_response
+        try:
+            items = json.loads(json_str).get("recommendations", [])
+        except (json.JSONDecodeError, AttributeError):
+            return {}
+
+        recommendations = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("index"))
+            except (TypeError, ValueError):
+                continue
+            recommendation = item.get("recommendation")
+            if 0 <= index < len(issues) and isinstance(recommendation, str) and recommendation.strip():
+                recommendations[index] = recommendation
+        return recommendations
@@ -2,10 +2,24 @@
 # In our current design, this is a utility class, not an LLM agent.
 # It will contain methods for creating PDF and Markdown reports.
 
-import os
+import html
+import json
 from typing import List, Dict, Any, Optional
-from tempfile import TemporaryDirectory
-from app.services.pdf_tools import generate_pdf_report
+from app.services.pdf_tools import render_pdf_report_async
+
+# Bump whenever a renderer's output changes so cached reports are rendered again
+REPORT_LAYOUT_VERSION = "1"
+
+# Format -> (media type, file extension)
+REPORT_FORMATS = {
+    "pdf": ("application/pdf", "pdf"),
+    "markdown": ("text/markdown; charset=utf-8", "md"),
+    "html": ("text/html; charset=utf-8", "html"),
+    "json": ("application/json", "json"),
+}
+
+def report_url(audit_id: str, report_format: str = "pdf") -> str:
+    return f"/api/v1/audit/report/{audit_id}?format={report_format}"
 
 class ReportGeneratorAgent:
     """
@@ -13,16 +27,52 @@ class ReportGeneratorAgent:
     from the final, structured audit data. This is not an LLM agent.
     """
 
-    def create_pdf_report(self, score: Optional[int], issues: List[Dict[str, Any]], sections: List[Dict[str, Any]], overall_severity: str, output_dir: str) -> str:
+    @staticmethod
+    def build_sections(issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        One report section per issue, or a single "no issues" section.
+        """
+        sections = []
+        for issue in issues:
+            sections.append({
+                "title": f"Issue: {issue.get('description', 'N/A')}",
+                "content": f"Severity: {issue.get('severity', 'N/A')}\n\nRecommendation: {issue.get('recommendation', 'N/A')}",
+                "flagged": True
+            })
+        if not issues:
+            sections.append({
+                "title": "No Compliance Issues Found",
+                "content": "Based on the provided documents and control families, no compliance gaps were identified.",
+                "flagged": False
+            })
+        return sections
+
+    async def render(self, audit: Dict[str, Any], report_format: str) -> bytes:
+        """
+        Renders a stored audit (see AuditStore) in one of REPORT_FORMATS.
+        """
+        score = audit.get("score")
+        issues = audit.get("issues") or []
+        sections = self.build_sections(issues)
+        if report_format == "pdf":
+            return await self.render_pdf_report(score, issues, sections, audit.get("overall_severity", "None"))
+        if report_format == "markdown":
+            return self.create_markdown_report(score, issues, sections).encode("utf-8")
+        if report_format == "html":
+            return self.create_html_report(score, issues, sections, audit.get("company_name")).encode("utf-8")
+        if report_format == "json":
+            return self.create_json_report(audit).encode("utf-8")
+        raise ValueError(f"Unsupported report format: {report_format}")
+
+    async def render_pdf_report(self, score: Optional[int], issues: List[Dict[str, Any]], sections: List[Dict[str, Any]], overall_severity: str) -> bytes:
         """
-        Generates a PDF report and returns the file path.
+        Renders a PDF report in memory, in the render process pool, and returns its bytes.
         """
-        return generate_pdf_report(
-            sections=sections, 
-            score=score, 
-            issues=issues, 
-            overall_severity=overall_severity,
-            output_dir=output_dir
+        return await render_pdf_report_async(
+            sections=sections,
+            score=score,
+            issues=issues,
+            overall_severity=overall_severity
         )
 
     def create_markdown_report(self, score: Optional[int], issues: List[Dict[str, Any]], sections: List[Dict[str, Any]]) -> str:
@@ -49,3 +99,38 @@ class ReportGeneratorAgent:
                 markdown += "---\n"
                 
         return markdown
+
+    def create_html_report(self, score: Optional[int], issues: List[Dict[str, Any]], sections: List[Dict[str, Any]], company_name: Optional[str] = None) -> str:
+        """
+        Generates a standalone HTML report and returns it as a string.
+        """
+        title = f"Audit Report: {company_name}" if company_name else "Audit Report"
+        parts = [
+            "<!DOCTYPE html>",
+            f"<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title></head><body>",
+            f"<h1>{html.escape(title)}</h1>",
+            f"<p><strong>Overall Compliance Score:</strong> {score}/100</p>",
+            "<h2>Summary of Findings</h2>",
+        ]
+        for section in sections:
+            flag = "✅" if not section.get('flagged') else "❌"
+            parts.append(f"<h3>{flag} {html.escape(section.get('title', 'Untitled Section'))}</h3>")
+            parts.append(f"<p>{html.escape(section.get('content', '')).replace(chr(10), '<br>')}</p>")
+
+        parts.append("<h2>Detailed Issues and Recommendations</h2>")
+        if not issues:
+            parts.append("<p>No significant issues were identified.</p>")
+        for issue in issues:
+            parts.append(f"<h3>Severity: {html.escape(str(issue.get('severity', 'N/A')))}</h3>")
+            parts.append(f"<p><strong>Description:</strong> {html.escape(str(issue.get('description', '')))}</p>")
+            parts.append(f"<pre>{html.escape(str(issue.get('recommendation', '')))}</pre>")
+        parts.append("</body></html>")
+        return "\n".join(parts)
+
+    def create_json_report(self, audit: Dict[str, Any]) -> str:
+        """
+        Generates a JSON report of the stored audit result and returns it as a string.
+        """
+        fields = ("company_name", "audit_type", "audit_scope", "control_families", "project_id", "score", "overall_severity", "issue_counts", "issues", "created_at")
+        report = {"audit_id": str(audit.get("_id")), **{key: audit.get(key) for key in fields}}
+        return json.dumps(report, default=str, ensure_ascii=False, indent=2)
@@ -1,29 +1,47 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, Response, HTTPException
-from typing import Optional
-from app.domain.models.audit_orchestrator import AuditRunResponse, AuditHistoryResponse
+import asyncio
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Optional, Tuple, Union
+from app.core.config import settings
+from app.domain.models.audit_orchestrator import AuditRunResponse, AuditHistoryResponse, AuditJobResponse
 from app.agents.audit_orchestrator import AuditOrchestrator
-from app.services.vertex_ai import VertexAIClient
-from app.services.adk import ADKClient
 from app.api.v1.endpoints.auth import get_current_user
-from app.services.pdf_tools import get_pdf_from_db
+from app.services.pdf_tools import iter_gridfs_range
 from app.infrastructure.db import mongodb
+from app.infrastructure.registry import get_audit_orchestrator
+from app.services.audit_jobs import audit_job_store, audit_job_queue
+from app.services.audit_store import audit_store
+from app.agents.sub_agents.report_generator import REPORT_FORMATS
 from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
 from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 
 router = APIRouter()
 
-def get_audit_orchestrator():
-    vertex_ai = VertexAIClient()
-    adk = ADKClient()
-    return AuditOrchestrator(vertex_ai, adk)
+def _job_response(job: dict) -> AuditJobResponse:
+    return AuditJobResponse(
+        job_id=job["_id"],
+        status=job["status"],
+        stage=job.get("stage"),
+        result=job.get("result"),
+        error=job.get("error"),
+        created_at=job.get("created_at"),
+        updated_at=job.get("updated_at")
+    )
 
-@router.post("/run", response_model=AuditRunResponse)
+@router.post("/run", response_model=Union[AuditRunResponse, AuditJobResponse])
 async def run_audit(
+    response: Response,
     audit_type: str = Form(...),
     company_name: str = Form(...),
     audit_scope: str = Form(...),
     control_families: str = Form(..., description="A comma-separated list of control families to evaluate."),
     project_id: Optional[str] = Form(None),
+    run_mode: Optional[str] = Form(None, description='"sync" waits for the audit result; "job" returns a job ID to poll at /audit/jobs/{job_id}. Defaults to AUDIT_RUN_MODE.'),
     documents: list[UploadFile] = File(...),
     orchestrator: AuditOrchestrator = Depends(get_audit_orchestrator),
     current_user=Depends(get_current_user)
@@ -31,6 +49,26 @@ async def run_audit(
     # Split the comma-separated string into a list
     control_families_list = [item.strip() for item in control_families.split(',')]
 
+    if (run_mode or settings.AUDIT_RUN_MODE) == "job":
+        # Only the upload happens in the request; text extraction and the audit run on the job queue
+        doc_ids = await orchestrator.upload_documents(documents, str(current_user.id), extract=False)
+        job = await audit_job_store.create(
+            user_id=str(current_user.id),
+            session_id=str(current_user.id),
+            params={
+                "audit_type": audit_type,
+                "company_name": company_name,
+                "audit_scope": audit_scope,
+                "control_families": control_families_list,
+                "project_id": project_id,
+            },
+            doc_ids=doc_ids,
+            backend=audit_job_queue.backend
+        )
+        await audit_job_queue.submit(job["_id"])
+        response.status_code = 202
+        return _job_response(job)
+
     result = await orchestrator.run_audit(
         audit_type=audit_type,
         company_name=company_name,
@@ -43,54 +81,293 @@ async def run_audit(
     )
     return result
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@router.post("/run/stream")
+async def run_audit_stream(
+    audit_type: str = Form(...),
+    company_name: str = Form(...),
+    audit_scope: str = Form(...),
+    control_families: str = Form(..., description="A comma-separated list of control families to evaluate."),
+    project_id: Optional[str] = Form(None),
+    documents: list[UploadFile] = File(...),
+    orchestrator: AuditOrchestrator = Depends(get_audit_orchestrator),
+    current_user=Depends(get_current_user)
+):
+    """
+    Runs an audit and streams its progress as Server-Sent Events: `stage`, `issue`, `score`,
+    `recommendation`, then `completed` with the full result (or `error`).
+    Closing the connection cancels the audit.
+    """
+    control_families_list = [item.strip() for item in control_families.split(',')]
+    user_id = str(current_user.id)
+    # Upload inside the request: the form files are closed once the response starts
+    doc_ids = await orchestrator.upload_documents(documents, user_id)
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def progress(event: str, data: dict):
+        if event != "checkpoint":
+            await queue.put((event, data))
+
+    async def run():
+        try:
+            result = await orchestrator.audit_documents(
+                audit_type=audit_type,
+                company_name=company_name,
+                audit_scope=audit_scope,
+                control_families=control_families_list,
+                doc_ids=doc_ids,
+                user_id=user_id,
+                session_id=user_id,
+                project_id=project_id,
+                progress=progress
+            )
+            await queue.put(("completed", result))
+        except Exception as e:
+            await queue.put(("error", {"detail": str(e)}))
+        finally:
+            await queue.put(None)
+
+    async def events():
+        yield _sse("stage", {"stage": "uploaded", "doc_ids": doc_ids})
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=settings.AUDIT_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line so proxies don't close an idle stream during long model calls
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            # Also runs when the client disconnects and the response is cancelled
+            task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/jobs/{job_id}", response_model=AuditJobResponse)
+async def get_audit_job(job_id: str, current_user=Depends(get_current_user)):
+    """
+    Returns the status, current stage and (once completed) the result of a queued audit.
+    """
+    job = await audit_job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Audit job not found")
+    if job.get("user_id") != str(current_user.id) and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to access this audit job")
+    return _job_response(job)
+
 @router.get("/history", response_model=list)
 async def get_audit_history(
+    project_id: Optional[str] = None,
     orchestrator: AuditOrchestrator = Depends(get_audit_orchestrator),
     current_user=Depends(get_current_user)
 ):
     """
-    Retrieves the audit history for the currently authenticated user.
+    Retrieves the audit history for the currently authenticated user, optionally for one project.
     """
     user_id = current_user.id
     if not user_id:
         raise HTTPException(status_code=403, detail="User ID not found in token.")
 
-    history = await orchestrator.get_history(user_id)
+    history = await orchestrator.get_history(user_id, project_id)
     return history
 
+@router.get("/history/summary", response_model=dict)
+async def get_audit_summary(
+    project_id: Optional[str] = None,
+    current_user=Depends(get_current_user)
+):
+    """
+    Audit count, score statistics and issue totals per severity for the current user.
+    """
+    user_id = current_user.id
+    if not user_id:
+        raise HTTPException(status_code=403, detail="User ID not found in token.")
+
+    return await audit_store.summary(str(user_id), project_id)
+
+@router.get("/report/{audit_id}", response_class=Response)
+async def get_audit_report(
+    audit_id: str,
+    request: Request,
+    format: str = "pdf",
+    orchestrator: AuditOrchestrator = Depends(get_audit_orchestrator),
+    current_user=Depends(get_current_user)
+):
+    """
+    Returns an audit's report as pdf, markdown, html or json. Each format is rendered
+    on its first request and streamed from the GridFS cache, with Range and ETag support.
+    """
+    if format not in REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(REPORT_FORMATS)}")
+    audit = await audit_store.get(audit_id)
+    if not audit:
+        raise HTTPException(status_code=404, detail="Audit not found")
+    if audit.get("user_id") != str(current_user.id) and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to access this audit")
+
+    media_type, extension = REPORT_FORMATS[format]
+    if audit.get("legacy"):
+        # Audits from before structured results were stored only have their PDF
+        if format != "pdf" or not audit.get("pdf_id"):
+            raise HTTPException(status_code=404, detail="Only the PDF report is available for this audit")
+        report_id = audit["pdf_id"]
+    else:
+        report_id = await orchestrator.get_report(audit, format)
+
+    grid_out = await _open_gridfs(report_id)
+    return _gridfs_response(request, grid_out, media_type, f"audit_report_{audit_id}.{extension}")
+
+async def _open_gridfs(file_id: str):
+    try:
+        return await AsyncIOMotorGridFSBucket(mongodb.db).open_download_stream(ObjectId(file_id))
+    except NoFile:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+async def _serve_audit_pdf(request: Request, file_id: str, current_user) -> Response:
+    audit = await audit_store.get(file_id) or await audit_store.find_by_replaced_pdf(file_id)
+    if not audit or audit.get("legacy"):
+        raise HTTPException(status_code=404, detail="PDF not found")
+    if audit.get("user_id") != str(current_user.id) and current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to access this PDF")
+    # A PDF rendered during the audit is served as is; only a report rendered on first
+    # request needs the AI services, so downloads keep working while they are unavailable
+    report_id = audit.get("pdf_id") or await get_audit_orchestrator().get_report(audit, "pdf")
+    grid_out = await _open_gridfs(report_id)
+    return _gridfs_response(request, grid_out, "application/pdf", f"audit_report_{audit['_id']}.pdf")
+
+def _parse_range(header: str, length: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range `Range` header into an inclusive (start, end) pair. Returns None for
+    headers that should be ignored (malformed, other units, multiple ranges); a range with
+    start >= length is unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            suffix = int(last)
+            if suffix <= 0:
+                return length, length - 1
+            return max(0, length - suffix), length - 1
+        start = int(first)
+        end = min(int(last), length - 1) if last else length - 1
+    except ValueError:
+        return None
+    if start < 0 or (end < start and start < length):
+        return None
+    return start, end
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # Weak comparison, as If-None-Match requires
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError, IndexError):
+            # Unparseable: ignore the header
+            return False
+        if since.tzinfo is None:
+            # "-0000" and zone-less dates parse naive; HTTP dates are GMT
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+def _gridfs_response(request: Request, grid_out, media_type: str, filename: str) -> Response:
+    """
+    Streams an open GridFS file, honouring single byte ranges and conditional GETs.
+    The ETag is the content hash recorded at upload (or the file id; GridFS files never change).
+    """
+    length = grid_out.length
+    metadata = grid_out.metadata or {}
+    etag = f'"{metadata.get("sha256") or grid_out._id}"'
+    last_modified = grid_out.upload_date.replace(tzinfo=timezone.utc)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Accept-Ranges": "bytes",
+        # Cacheable, but always revalidated so access checks still run
+        "Cache-Control": "no-cache",
+        "Content-Disposition": f'attachment; filename="{filename}"',
+    }
+
+    if _not_modified(request, etag, last_modified):
+        grid_out.close()
+        return Response(status_code=304, headers=headers)
+
+    start, end, status_code = 0, length - 1, 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range: only honour the range while the client's copy is still current
+    if range_header and (if_range is None or if_range.strip() in (etag, headers["Last-Modified"])):
+        byte_range = _parse_range(range_header, length)
+        if byte_range is not None:
+            start, end = byte_range
+            if start >= length:
+                grid_out.close()
+                return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{length}"})
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+
+    headers["Content-Length"] = str(max(0, end - start + 1))
+    return StreamingResponse(iter_gridfs_range(grid_out, start, end), status_code=status_code, media_type=media_type, headers=headers)
+
 @router.get("/pdf/{file_id}", response_class=Response)
-async def serve_pdf(file_id: str, current_user=Depends(get_current_user)):
+async def serve_pdf(
+    file_id: str,
+    request: Request,
+    current_user=Depends(get_current_user)
+):
+    """
+    Streams a PDF report from GridFS with Range, ETag and Last-Modified support.
+    `file_id` is either the GridFS id of a PDF rendered during the audit, the id such a PDF
+    had before it was re-rendered or, for reports rendered on first request, the audit id.
+    """
     try:
-        # Check ownership or admin
-        fs = AsyncIOMotorGridFSBucket(mongodb.db)
-        from bson.errors import InvalidId
         try:
             oid = ObjectId(file_id)
         except InvalidId:
             raise HTTPException(status_code=404, detail="Invalid file id")
-        
-        file_info = await fs.find({"_id": oid}).to_list(1)
-        if not file_info:
-            raise HTTPException(status_code=404, detail="PDF not found")
-        
-        file_doc = file_info[0]
-        metadata = file_doc.get("metadata")
+
+        # One lookup: the download stream carries the file document used for the access check
+        fs = AsyncIOMotorGridFSBucket(mongodb.db)
+        try:
+            grid_out = await fs.open_download_stream(oid)
+        except NoFile:
+            return await _serve_audit_pdf(request, file_id, current_user)
+
+        metadata = grid_out.metadata
         owner_id = metadata.get("user_id") if metadata else None
-        
-        user_id = current_user.id
-        user_role = current_user.role
 
-        if (owner_id != str(user_id)) and (user_role != "admin"):
+        # Check ownership or admin
+        if (owner_id != str(current_user.id)) and (current_user.role != "admin"):
+            grid_out.close()
             raise HTTPException(status_code=403, detail="Not authorized to access this PDF")
-        
-        pdf_bytes = await get_pdf_from_db(mongodb.db, file_id)
-
-        # Add a Content-Disposition header to encourage browsers to download the file.
-        headers = {
-            'Content-Disposition': f'attachment; filename="audit_report_{file_id}.pdf"'
-        }
-        return Response(content=pdf_bytes, media_type="application/pdf", headers=headers)
+
+        return _gridfs_response(request, grid_out, "application/pdf", f"audit_report_{file_id}.pdf")
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An internal error occurred: {e}")
@@ -3,6 +3,7 @@ from typing import Optional
 from app.api.v1.endpoints.auth import get_current_user
 from app.agents.explanation_orchestrator import ExplanationOrchestrator
 from app.domain.models.explanation_orchestrator import ExplanationRequest, ExplanationResponse
+from app.infrastructure.registry import get_explanation_orchestrator
 
 router = APIRouter()
 
@@ -10,18 +11,15 @@ router = APIRouter()
 async def get_explanation(
     request: ExplanationRequest,
     user: dict = Depends(get_current_user),
+    orchestrator: ExplanationOrchestrator = Depends(get_explanation_orchestrator),
     x_session_id: Optional[str] = Header(None, alias="X-Session-ID")
 ):
     """
     Accepts a user's query and returns a synthesized explanation based on research.
     """
-    from app.main import adk, vertex_ai # Lazy import to avoid circular dependency
-    
     user_id = user.id
     session_id = x_session_id or "default_session"
     
-    orchestrator = ExplanationOrchestrator(vertex_ai, adk)
-    
     try:
         result = await orchestrator.get_explanation(
             query=request.query,
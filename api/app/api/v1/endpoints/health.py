@@ -1,18 +1,44 @@
-from fastapi import APIRouter, Depends
-from app.infrastructure.db import get_db
-from motor.motor_asyncio import AsyncIOMotorDatabase
-
-router = APIRouter()
-
-@router.get("/", summary="Health check")
-async def health_check(db: AsyncIOMotorDatabase = Depends(get_db)):
-    try:
-        # MongoDB ping
-        await db.command("ping")
-        db_status = "ok"
-    except Exception:
-        db_status = "unreachable"
-    return {
-        "status": "ok",
-        "database": db_status
+from fastapi import APIRouter, Depends, HTTPException, Response
+from app.api.v1.endpoints.auth import get_current_user
+from app.infrastructure.db import get_db
+from app.infrastructure.registry import registry
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+router = APIRouter()
+
+@router.get("/", summary="Health check")
+async def health_check(db: AsyncIOMotorDatabase = Depends(get_db)):
+    try:
+        # MongoDB ping
+        await db.command("ping")
+        db_status = "ok"
+    except Exception:
+        db_status = "unreachable"
+    return {
+        "status": "ok",
+        "database": db_status,
+        "agents": "ready" if registry.ready else "initializing"
+    }
+
+@router.get("/ready", summary="Readiness check")
+async def readiness_check(response: Response):
+    """Returns 503 until the shared AI clients and orchestrators have been built."""
+    if not registry.ready:
+        response.status_code = 503
+        return {"status": "not_ready", "detail": registry.error}
+    return {"status": "ready"}
+
+@router.get("/metrics", summary="AI service metrics")
+async def ai_metrics(current_user=Depends(get_current_user)):
+    """Counters for the shared ADK client (LLM response cache, limiter, runner pool and sessions). Admins only."""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized to view metrics")
+    if not registry.ready:
+        return {"status": "not_ready"}
+    return {
+        "status": "ok",
+        "llm_cache": registry.adk.cache.stats(),
+        "llm_limiter": registry.adk.limiter.stats(),
+        "runner_pool": registry.adk.runner_pool_stats(),
+        "sessions": await registry.adk.session_service.stats()
     }
\ No newline at end of file
@@ -69,6 +69,87 @@ class Settings(BaseSettings):
     GEMINI_MODEL_NAME: str = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-pro-001")
     GEMINI_MAX_OUTPUT_TOKENS: int = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", 2048))
     GEMINI_TEMPERATURE: float = float(os.getenv("GEMINI_TEMPERATURE", 0.7))
+    ADK_AGENT_POOL_SIZE: int = int(os.getenv("ADK_AGENT_POOL_SIZE", 64))
+
+    # ADK sessions ("memory" or "mongo")
+    SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "memory")
+    SESSION_MAX_SESSIONS: int = int(os.getenv("SESSION_MAX_SESSIONS", 1000))
+    SESSION_TTL_SECONDS: int = int(os.getenv("SESSION_TTL_SECONDS", 3600))
+    SESSION_MAX_EVENTS: int = int(os.getenv("SESSION_MAX_EVENTS", 50))
+    # History token budget before each agent call; per-agent overrides as "agent:tokens,..."
+    SESSION_HISTORY_TOKEN_BUDGET: int = int(os.getenv("SESSION_HISTORY_TOKEN_BUDGET", 8000))
+    SESSION_HISTORY_BUDGETS: str = os.getenv("SESSION_HISTORY_BUDGETS", "compliance_scanner:4000,synthesizer:4000")
+    # Agents that get a throwaway session per call (their prompts are self-contained)
+    EPHEMERAL_SESSION_AGENTS: str = os.getenv("EPHEMERAL_SESSION_AGENTS", "remediation_suggestor")
+
+    # LLM backend: "live", "synthetic", "record" or "replay"
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "live")
+    LLM_CASSETTE_DIR: str = os.getenv("LLM_CASSETTE_DIR", "cassettes")
+    LLM_SYNTHETIC_LATENCY_DISTRIBUTION: str = os.getenv("LLM_SYNTHETIC_LATENCY_DISTRIBUTION", "lognormal")
+    LLM_SYNTHETIC_LATENCY_MEAN_MS: float = float(os.getenv("LLM_SYNTHETIC_LATENCY_MEAN_MS", 800))
+    LLM_SYNTHETIC_LATENCY_JITTER_MS: float = float(os.getenv("LLM_SYNTHETIC_LATENCY_JITTER_MS", 300))
+    LLM_SYNTHETIC_SEED: int = int(os.getenv("LLM_SYNTHETIC_SEED", 0))
+
+    # LLM response cache
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "False").lower() == "true"
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+    LLM_CACHE_PERSISTENT: bool = os.getenv("LLM_CACHE_PERSISTENT", "True").lower() == "true"
+    LLM_CACHE_BYPASS_AGENTS: str = os.getenv("LLM_CACHE_BYPASS_AGENTS", "regulation_finder")
+
+    # Shared LLM limiter (0 disables the per-minute buckets)
+    LLM_INITIAL_CONCURRENCY: int = int(os.getenv("LLM_INITIAL_CONCURRENCY", 4))
+    LLM_MIN_CONCURRENCY: int = int(os.getenv("LLM_MIN_CONCURRENCY", 1))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+    LLM_REQUESTS_PER_MINUTE: int = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 4))
+    LLM_RETRY_BASE_DELAY: float = float(os.getenv("LLM_RETRY_BASE_DELAY", 1.0))
+    LLM_RETRY_MAX_DELAY: float = float(os.getenv("LLM_RETRY_MAX_DELAY", 30.0))
+
+    # Document text extraction (0 workers = one per CPU, negative = in-process thread)
+    PDF_EXTRACTION_WORKERS: int = int(os.getenv("PDF_EXTRACTION_WORKERS", 0))
+    PDF_PAGES_PER_TASK: int = int(os.getenv("PDF_PAGES_PER_TASK", 25))
+    # Report rendering pool (0 workers = one per CPU, negative = in-process thread)
+    PDF_RENDER_WORKERS: int = int(os.getenv("PDF_RENDER_WORKERS", 2))
+
+    # Compliance scanner: "auto", "inline", "retrieval" or "tool"
+    SCANNER_MODE: str = os.getenv("SCANNER_MODE", "auto")
+    SCANNER_INLINE_TOKEN_BUDGET: int = int(os.getenv("SCANNER_INLINE_TOKEN_BUDGET", 100000))
+    # Scanner fan-out: "none", "family" or "family_document" (each document judged on its own);
+    # inline "family" shards each embed all documents, so prefer "family_document" for inline scans
+    SCANNER_FANOUT: str = os.getenv("SCANNER_FANOUT", "none")
+    SCANNER_SHARD_CONCURRENCY: int = int(os.getenv("SCANNER_SHARD_CONCURRENCY", 4))
+
+    # Scanner retrieval mode: BM25 over persisted document chunks
+    RETRIEVAL_CHUNK_CHARS: int = int(os.getenv("RETRIEVAL_CHUNK_CHARS", 1200))
+    RETRIEVAL_CHUNK_OVERLAP: int = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", 200))
+    SCANNER_RETRIEVAL_TOP_K: int = int(os.getenv("SCANNER_RETRIEVAL_TOP_K", 5))
+
+    # Audit remediation batching (batch size <= 1 falls back to one LLM call per issue)
+    REMEDIATION_BATCH_SIZE: int = int(os.getenv("REMEDIATION_BATCH_SIZE", 10))
+    REMEDIATION_BATCH_MAX_CHARS: int = int(os.getenv("REMEDIATION_BATCH_MAX_CHARS", 12000))
+    # Longest an issue waits for its remediation batch to fill before the batch is sent anyway
+    REMEDIATION_BATCH_MAX_WAIT_SECONDS: float = float(os.getenv("REMEDIATION_BATCH_MAX_WAIT_SECONDS", 1.5))
+
+    # Incremental re-audits: scan per (document, control family) pair and reuse the cached
+    # findings of pairs whose document hash, audit context, prompts and model are unchanged
+    AUDIT_INCREMENTAL: bool = os.getenv("AUDIT_INCREMENTAL", "False").lower() == "true"
+    AUDIT_FINDINGS_TTL_SECONDS: int = int(os.getenv("AUDIT_FINDINGS_TTL_SECONDS", 90 * 24 * 3600))
+
+    # Audit jobs: /audit/run waits for the result ("sync") or returns a job ID ("job").
+    # Jobs run in-process ("local") or on Celery workers over REDIS_URL ("celery").
+    AUDIT_RUN_MODE: str = os.getenv("AUDIT_RUN_MODE", "sync")
+    AUDIT_JOB_BACKEND: str = os.getenv("AUDIT_JOB_BACKEND", "local")
+    AUDIT_JOB_CONCURRENCY: int = int(os.getenv("AUDIT_JOB_CONCURRENCY", 2))
+    AUDIT_JOB_MAX_ATTEMPTS: int = int(os.getenv("AUDIT_JOB_MAX_ATTEMPTS", 3))
+    # A running job's owner renews its lease every quarter of this; an expired lease can be taken over
+    AUDIT_JOB_LEASE_SECONDS: int = int(os.getenv("AUDIT_JOB_LEASE_SECONDS", 120))
+    AUDIT_JOB_TTL_SECONDS: int = int(os.getenv("AUDIT_JOB_TTL_SECONDS", 7 * 24 * 3600))
+    # Reports: "lazy" renders each format on first request, "eager" renders the PDF during the audit
+    REPORT_RENDER_MODE: str = os.getenv("REPORT_RENDER_MODE", "lazy")
+    # Idle interval before /audit/run/stream sends a keep-alive comment
+    AUDIT_STREAM_KEEPALIVE_SECONDS: float = float(os.getenv("AUDIT_STREAM_KEEPALIVE_SECONDS", 15))
 
     # For streaming responses
     JINA_API_KEY: str = os.getenv("JINA_API_KEY", "")
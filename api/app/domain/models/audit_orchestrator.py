@@ -1,10 +1,12 @@
 from pydantic import BaseModel, Field
 from typing import Any, Dict, List, Optional
+from datetime import datetime
 
 class AuditIssue(BaseModel):
     severity: str
     description: str
     recommendation: str
+    control_family: Optional[str] = None
 
 class AuditReportSection(BaseModel):
     title: str
@@ -30,6 +32,20 @@ class AuditRunResponse(BaseModel):
     issues: Optional[List[AuditIssue]] = None
     report_sections: Optional[List[AuditReportSection]] = None
     pdf_url: Optional[str] = None
+    report_urls: Optional[Dict[str, str]] = None
+    audit_id: Optional[str] = None
+
+class AuditJobResponse(BaseModel):
+    """
+    Status of a queued audit. `result` is set once `status` is "completed".
+    """
+    job_id: str
+    status: str
+    stage: Optional[str] = None
+    result: Optional[AuditRunResponse] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
 class AuditHistoryRequest(BaseModel):
     user_id: str
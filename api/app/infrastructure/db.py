@@ -43,6 +43,40 @@ async def create_indexes(db):
         await db.fs.files.create_index("metadata.project_id")
         await db.fs.files.create_index("metadata.user_id")
         await db.fs.files.create_index("metadata.type")
+        await db.fs.files.create_index("metadata.sha256")
+        # Rendered reports cached per audit and format
+        await db.fs.files.create_index([("metadata.audit_id", 1), ("metadata.format", 1)])
+
+        # Extracted document text, keyed by content hash
+        await db.document_texts.create_index("parser_version")
+
+        # Structured audit results: history, per-project lookups and analytics
+        # Lazily rendered audits have no pdf_id, so uniqueness only applies where it is set
+        await db.audits.create_index("pdf_id", unique=True, partialFilterExpression={"pdf_id": {"$type": "string"}})
+        # Old links to PDFs that were re-rendered under a new id
+        await db.audits.create_index("replaced_pdf_ids", sparse=True)
+        await db.audits.create_index([("user_id", 1), ("created_at", -1)])
+        await db.audits.create_index([("user_id", 1), ("project_id", 1), ("created_at", -1)])
+        await db.audits.create_index([("project_id", 1), ("created_at", -1)])
+
+        # Audit jobs: per-user listing, expired a while after their last update
+        await db.audit_jobs.create_index([("user_id", 1), ("created_at", -1)])
+        # Stale-lease sweep over unfinished jobs
+        await db.audit_jobs.create_index([("status", 1), ("updated_at", 1)])
+        await db.audit_jobs.create_index("updated_at", expireAfterSeconds=settings.AUDIT_JOB_TTL_SECONDS)
+
+        # Reusable per (document, control family) findings for incremental re-audits
+        await db.audit_findings.create_index("created_at", expireAfterSeconds=settings.AUDIT_FINDINGS_TTL_SECONDS)
+
+        # Retrieval chunks, keyed by content hash like document_texts
+        await db.document_chunks.create_index([("parser_version", 1), ("chunker_version", 1)])
+
+        # LLM response cache: expire entries at their own expires_at
+        await db.llm_cache.create_index("expires_at", expireAfterSeconds=0)
+
+        # ADK sessions (SESSION_BACKEND=mongo): expire idle sessions
+        await db.adk_sessions.create_index("updated_at", expireAfterSeconds=settings.SESSION_TTL_SECONDS)
+        await db.adk_sessions.create_index([("app_name", 1), ("user_id", 1)])
         
         print("✅ Database indexes created successfully")
     except Exception as e:
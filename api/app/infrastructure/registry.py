@@ -0,0 +1,74 @@
+import asyncio
+from typing import Optional
+from fastapi import FastAPI, HTTPException
+from app.services.adk import ADKClient
+from app.services.vertex_ai import VertexAIClient
+from app.agents.audit_orchestrator import AuditOrchestrator
+from app.agents.explanation_orchestrator import ExplanationOrchestrator
+from app.infrastructure.logger import Logger
+
+logger = Logger(__name__)
+
+class ClientRegistry:
+    """
+    Process-wide holder for the AI clients and orchestrators.
+    Everything here is built once at startup and shared by all requests.
+    """
+    vertex_ai: VertexAIClient = None
+    adk: ADKClient = None
+    audit_orchestrator: AuditOrchestrator = None
+    explanation_orchestrator: ExplanationOrchestrator = None
+    ready: bool = False
+    error: Optional[str] = None
+
+registry = ClientRegistry()
+
+def _build_clients():
+    """Builds the clients and orchestrators. Runs in a worker thread because vertexai.init blocks."""
+    vertex_ai = VertexAIClient()
+    adk = ADKClient()
+    registry.vertex_ai = vertex_ai
+    registry.adk = adk
+    registry.audit_orchestrator = AuditOrchestrator(vertex_ai, adk)
+    registry.explanation_orchestrator = ExplanationOrchestrator(vertex_ai, adk)
+
+async def init_registry(app: FastAPI):
+    """Build and warm the shared clients and attach the registry to the app."""
+    app.registry = registry
+    try:
+        await asyncio.to_thread(_build_clients)
+        registry.ready = True
+        registry.error = None
+        logger.info("AI client registry initialized.")
+    except Exception as e:
+        # Keep the API up (auth, projects, health) even if the AI backends are misconfigured
+        registry.ready = False
+        registry.error = str(e)
+        logger.error(f"Failed to initialize AI client registry: {e}")
+
+def close_registry(app: FastAPI):
+    """Drop the shared clients."""
+    registry.ready = False
+    registry.vertex_ai = None
+    registry.adk = None
+    registry.audit_orchestrator = None
+    registry.explanation_orchestrator = None
+
+def _require_ready():
+    if not registry.ready:
+        raise HTTPException(status_code=503, detail="AI services are not ready yet.")
+
+def get_audit_orchestrator() -> AuditOrchestrator:
+    """Dependency returning the shared AuditOrchestrator."""
+    _require_ready()
+    return registry.audit_orchestrator
+
+def get_explanation_orchestrator() -> ExplanationOrchestrator:
+    """Dependency returning the shared ExplanationOrchestrator."""
+    _require_ready()
+    return registry.explanation_orchestrator
+
+def get_adk_client() -> ADKClient:
+    """Dependency returning the shared ADKClient."""
+    _require_ready()
+    return registry.adk
@@ -2,6 +2,7 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import time
+import asyncio
 import logging
 from app.core.config import settings, logger
 from app.api.v1.endpoints import (
@@ -15,7 +16,30 @@ from app.api.v1.endpoints import (
     clients
 )
 from fastapi.openapi.utils import get_openapi
+from contextlib import asynccontextmanager
 from app.infrastructure.db import init_db, close_db
+from app.infrastructure.registry import init_registry, close_registry
+from app.services.pdf_tools import shutdown_extraction_pool, shutdown_render_pool
+from app.services.audit_jobs import audit_job_queue
+from app.services.audit_store import audit_store
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db(app)
+    logger.info("MongoDB client initialized.")
+    await init_registry(app)
+    await audit_job_queue.recover()
+    # Reports generated before the audits collection existed
+    app.audit_backfill = asyncio.create_task(audit_store.backfill_from_gridfs())
+    yield
+    app.audit_backfill.cancel()
+    await asyncio.gather(app.audit_backfill, return_exceptions=True)
+    await audit_job_queue.shutdown()
+    shutdown_extraction_pool()
+    shutdown_render_pool()
+    close_registry(app)
+    close_db(app)
+    logger.info("MongoDB client closed.")
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -26,19 +50,10 @@ app = FastAPI(
 This API provides endpoints for authentication, project management, audits, and more. All endpoints are documented below. JWT-protected endpoints show a lock icon and require a valid Bearer token.
 """,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan
 )
 
-@app.on_event("startup")
-async def startup_event():
-    init_db(app)
-    logger.info("MongoDB client initialized.")
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    close_db(app)
-    logger.info("MongoDB client closed.")
-
 @app.middleware("http")
 async def db_session_middleware(request: Request, call_next):
     request.state.db = app.mongodb
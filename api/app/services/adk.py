@@ -1,12 +1,20 @@
 import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncGenerator, Tuple
 import google.generativeai as genai
 from google.adk.agents import LlmAgent
+from google.adk.agents.run_config import RunConfig, StreamingMode
 from google.adk.tools import google_search
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from app.core.config import settings
 from google.genai.types import Content, Part
 from app.infrastructure.logger import Logger
+from app.services.llm_cache import LLMResponseCache
+from app.services.llm_limiter import llm_limiter
+from app.services.llm_backends import llm_backend
+from app.services.session_store import build_session_service
 from google.genai import Client
 
 logger = Logger(__name__)
@@ -21,7 +29,17 @@ class ADKClient:
     def __init__(self):
         self.model = settings.ADK_MODEL_NAME
         self.app_name = settings.GCP_PROJECT_NAME
-        self.session_service = InMemorySessionService()
+        self.session_service = build_session_service()
+        self.cache = LLMResponseCache()
+        self.limiter = llm_limiter
+        self.backend = llm_backend
+        # Compiled LlmAgent/Runner pairs keyed by (agent_name, instruction, tools)
+        self.runner_pool: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.runner_pool_size = settings.ADK_AGENT_POOL_SIZE
+        self.runner_pool_hits = 0
+        self.runner_pool_misses = 0
+        self.history_budgets = self._parse_agent_budgets(settings.SESSION_HISTORY_BUDGETS)
+        self.ephemeral_agents = {name.strip() for name in settings.EPHEMERAL_SESSION_AGENTS.split(",") if name.strip()}
         
         # Configure Gemini API if not using Vertex AI
         if not settings.GOOGLE_GENAI_USE_VERTEX and settings.GEMINI_API_KEY:
@@ -31,35 +49,118 @@ class ADKClient:
             self.gemini_model = None
 
     async def ensure_session(self, user_id: str, session_id: str):
-        session = await self.session_service.create_session(
+        # Reuse the existing session instead of recreating it on every call
+        session = await self.session_service.get_session(
             app_name=self.app_name,
             user_id=user_id,
             session_id=session_id
         )
+        if session is None:
+            session = await self.session_service.create_session(
+                app_name=self.app_name,
+                user_id=user_id,
+                session_id=session_id
+            )
         return session
 
-    async def run_agent(self, agent_name: str, data: dict, user_id: str, session_id: str, tools: list = None, instruction: str = None) -> dict:
+    def get_runner(self, agent_name: str, instruction: str, tools: list) -> Runner:
+        """
+        Returns a pooled Runner for this agent configuration, building it on first use.
+        Runners are stateless between invocations (state lives in the session service),
+        so one instance is safely shared by every user and session.
+        """
+        # Tools are keyed by identity; the pool entry holds a reference so ids stay unique
+        key = (agent_name, self.model, instruction, tuple(id(tool) for tool in tools))
+        entry = self.runner_pool.get(key)
+        if entry is not None:
+            self.runner_pool.move_to_end(key)
+            self.runner_pool_hits += 1
+            return entry[0]
+
+        self.runner_pool_misses += 1
+        agent = LlmAgent(
+            name=agent_name,
+            model=self.model,
+            instruction=instruction,
+            tools=tools,
+        )
+        runner = Runner(agent=agent, app_name=self.app_name, session_service=self.session_service)
+        self.runner_pool[key] = (runner, list(tools))
+        while len(self.runner_pool) > self.runner_pool_size:
+            self.runner_pool.popitem(last=False)
+        return runner
+
+    def runner_pool_stats(self) -> dict:
+        return {
+            "size": len(self.runner_pool),
+            "max_size": self.runner_pool_size,
+            "hits": self.runner_pool_hits,
+            "misses": self.runner_pool_misses,
+        }
+
+    async def run_agent(self, agent_name: str, data: dict, user_id: str, session_id: str, tools: list = None, instruction: str = None, use_cache: bool = True) -> dict:
+        if not (use_cache and self.cache.is_enabled_for(agent_name)):
+            return await self._run_agent_uncached(agent_name, data, user_id, session_id, tools, instruction)
+
+        cache_key = self.cache.make_key(
+            model=self.model,
+            agent_name=agent_name,
+            instruction=instruction if instruction is not None else "You are a helpful assistant.",
+            tools=tools if tools is not None else [google_search],
+            prompt=self._extract_prompt(data)
+        )
+        cached = await self.cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+
+        result = await self._run_agent_uncached(agent_name, data, user_id, session_id, tools, instruction)
+        # Only successful replies are worth replaying
+        if result and result.get("result"):
+            await self.cache.set(cache_key, agent_name, result)
+        return result
+
+    async def _run_agent_uncached(self, agent_name: str, data: dict, user_id: str, session_id: str, tools: list = None, instruction: str = None) -> dict:
+        if self.backend.is_live:
+            result = await self._run_agent_live(agent_name, data, user_id, session_id, tools, instruction)
+            await self.backend.record(
+                agent_name,
+                instruction if instruction is not None else "You are a helpful assistant.",
+                self._extract_prompt(data),
+                result.get("result")
+            )
+            return result
+
+        # Offline stand-in (synthetic or replay) still goes through the shared limiter
+        agent_instruction = instruction if instruction is not None else "You are a helpful assistant."
+        prompt = self._extract_prompt(data)
+        text = await self.limiter.run(
+            agent_name,
+            lambda: self.backend.generate(agent_name, agent_instruction, prompt, tools),
+            estimated_tokens=self._estimate_tokens(agent_instruction + prompt)
+        )
+        return {"result": text}
+
+    async def _run_agent_live(self, agent_name: str, data: dict, user_id: str, session_id: str, tools: list = None, instruction: str = None) -> dict:
         # If using Gemini API directly (not Vertex AI), use it instead
         if self.gemini_model and not settings.GOOGLE_GENAI_USE_VERTEX:
             # Use provided instruction or a default one
             agent_instruction = instruction if instruction is not None else "You are a helpful assistant."
+            prompt = self._extract_prompt(data)
 
-            prompt = getattr(data, "prompt", None)
-            if prompt is None and isinstance(data, dict):
-                prompt = data.get("prompt")
-            if prompt is None:
-                prompt = str(data)
-            
             try:
                 full_prompt = f"{agent_instruction}\n\n{prompt}"
-                response = self.gemini_model.generate_content(full_prompt)
+                # Await the async variant so the event loop keeps serving other requests
+                response = await self.limiter.run(
+                    agent_name,
+                    lambda: self.gemini_model.generate_content_async(full_prompt),
+                    estimated_tokens=self._estimate_tokens(full_prompt)
+                )
                 return {"result": response.text}
             except Exception as e:
                 logger.error(f"Gemini API error: {str(e)}")
                 # Fall back to ADK if Gemini fails
         
-        # Ensure session asynchronously before running agent
-        await self.ensure_session(user_id, session_id)
+        session_id, ephemeral = await self._open_session(agent_name, user_id, session_id)
 
         # Use provided tools or default to google_search
         agent_tools = tools if tools is not None else [google_search]
@@ -67,28 +168,192 @@ class ADKClient:
         # Use provided instruction or a default one
         agent_instruction = instruction if instruction is not None else "You are a helpful assistant."
 
-        agent = LlmAgent(
-            name=agent_name,
-            model=self.model,
-            instruction=agent_instruction,
-            tools=agent_tools,
+        prompt = self._extract_prompt(data)
+        logger.data({"prompt": prompt})
+        content = Content(role="user", parts=[Part(text=prompt)])
+        runner = self.get_runner(agent_name, agent_instruction, agent_tools)
+
+        async def run_once():
+            started = time.time()
+            final_response = None
+            try:
+                # Drive the async generator so model calls and tool calls never block the event loop
+                events = runner.run_async(user_id=user_id, session_id=session_id, new_message=content)
+                async for event in events:
+                    if event.content and event.content.parts:
+                        for part in event.content.parts:
+                            if part.text:
+                                final_response = part.text
+            except Exception:
+                # The limiter retries with the same message: drop this attempt's user turn and tool events
+                await self.session_service.discard_events_since(
+                    app_name=self.app_name, user_id=user_id, session_id=session_id, timestamp=started
+                )
+                raise
+            return final_response
+
+        try:
+            final_response = await self.limiter.run(
+                agent_name,
+                run_once,
+                estimated_tokens=self._estimate_tokens(agent_instruction + prompt)
+            )
+        finally:
+            if ephemeral:
+                await self.session_service.delete_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
+        return {"result": final_response}
+
+    async def _open_session(self, agent_name: str, user_id: str, session_id: str) -> Tuple[str, bool]:
+        """
+        Prepares the session for one agent call and returns (session_id, ephemeral).
+        Stateless agents run in a throwaway session; the rest get their history compacted.
+        """
+        if agent_name in self.ephemeral_agents:
+            session_id = f"{session_id}:{agent_name}:{uuid.uuid4().hex}"
+            await self.session_service.create_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
+            return session_id, True
+
+        # Ensure session asynchronously before running agent
+        await self.ensure_session(user_id, session_id)
+        await self.session_service.compact_history(
+            app_name=self.app_name,
+            user_id=user_id,
+            session_id=session_id,
+            token_budget=self.history_budgets.get(agent_name, settings.SESSION_HISTORY_TOKEN_BUDGET)
         )
+        return session_id, False
+
+    async def stream_agent(self, agent_name: str, data: dict, user_id: str, session_id: str, tools: list = None, instruction: str = None, use_cache: bool = True) -> AsyncGenerator[str, None]:
+        """
+        Streamed variant of `run_agent`: yields the reply text in chunks as the model produces it.
+        Cache hits are yielded as one chunk; complete replies are cached and recorded like `run_agent`'s.
+        Rate-limit and transient errors are retried with the limiter's backoff until the first
+        chunk is yielded; after that an error is raised to the caller.
+        """
+        agent_instruction = instruction if instruction is not None else "You are a helpful assistant."
+        prompt = self._extract_prompt(data)
+        cache_key = None
+        if use_cache and self.cache.is_enabled_for(agent_name):
+            cache_key = self.cache.make_key(
+                model=self.model,
+                agent_name=agent_name,
+                instruction=agent_instruction,
+                tools=tools if tools is not None else [google_search],
+                prompt=prompt
+            )
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                if cached.get("result"):
+                    yield cached["result"]
+                return
+
+        attempt = 0
+        while True:
+            if self.backend.is_live:
+                chunks = self._stream_agent_live(agent_name, agent_instruction, prompt, user_id, session_id, tools)
+            else:
+                chunks = self._stream_agent_offline(agent_name, agent_instruction, prompt, tools)
+            parts = []
+            try:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    yield chunk
+                break
+            except Exception as e:
+                attempt += 1
+                delay = None if parts else self.limiter.retry_delay(agent_name, e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+        text = "".join(parts)
+        await self.backend.record(agent_name, agent_instruction, prompt, text or None)
+        if cache_key and text:
+            await self.cache.set(cache_key, agent_name, {"result": text})
+
+    async def _stream_agent_offline(self, agent_name: str, instruction: str, prompt: str, tools: list = None) -> AsyncGenerator[str, None]:
+        async with self.limiter.slot(agent_name, estimated_tokens=self._estimate_tokens(instruction + prompt)):
+            async for chunk in self.backend.generate_stream(agent_name, instruction, prompt, tools):
+                yield chunk
+
+    async def _stream_agent_live(self, agent_name: str, instruction: str, prompt: str, user_id: str, session_id: str, tools: list = None) -> AsyncGenerator[str, None]:
+        if self.gemini_model and not settings.GOOGLE_GENAI_USE_VERTEX:
+            full_prompt = f"{instruction}\n\n{prompt}"
+            streamed = False
+            try:
+                async with self.limiter.slot(agent_name, estimated_tokens=self._estimate_tokens(full_prompt)):
+                    response = await self.gemini_model.generate_content_async(full_prompt, stream=True)
+                    async for chunk in response:
+                        if chunk.text:
+                            streamed = True
+                            yield chunk.text
+                return
+            except Exception as e:
+                logger.error(f"Gemini API error: {str(e)}")
+                # Fall back to ADK only if nothing has been handed to the caller yet
+                if streamed:
+                    raise
+
+        session_id, ephemeral = await self._open_session(agent_name, user_id, session_id)
+        agent_tools = tools if tools is not None else [google_search]
+        content = Content(role="user", parts=[Part(text=prompt)])
+        runner = self.get_runner(agent_name, instruction, agent_tools)
+        started = time.time()
+        try:
+            async with self.limiter.slot(agent_name, estimated_tokens=self._estimate_tokens(instruction + prompt)):
+                events = runner.run_async(
+                    user_id=user_id,
+                    session_id=session_id,
+                    new_message=content,
+                    run_config=RunConfig(streaming_mode=StreamingMode.SSE)
+                )
+                # Partial events carry the text deltas; the final event of a turn repeats the
+                # whole text, so it is only emitted when that turn was not streamed
+                turn_streamed = False
+                async for event in events:
+                    if not (event.content and event.content.parts):
+                        continue
+                    text = "".join(part.text for part in event.content.parts if part.text)
+                    if event.partial:
+                        if text:
+                            turn_streamed = True
+                            yield text
+                    else:
+                        if text and not turn_streamed:
+                            yield text
+                        turn_streamed = False
+        except Exception:
+            # stream_agent may retry with the same message: drop this attempt's user turn and tool events
+            if not ephemeral:
+                await self.session_service.discard_events_since(
+                    app_name=self.app_name, user_id=user_id, session_id=session_id, timestamp=started
+                )
+            raise
+        finally:
+            if ephemeral:
+                await self.session_service.delete_session(app_name=self.app_name, user_id=user_id, session_id=session_id)
+
+    @staticmethod
+    def _parse_agent_budgets(raw: str) -> dict:
+        """Parses "agent:tokens,agent:tokens" into a dict, skipping malformed entries."""
+        budgets = {}
+        for item in raw.split(","):
+            name, _, value = item.partition(":")
+            if name.strip() and value.strip().isdigit():
+                budgets[name.strip()] = int(value.strip())
+        return budgets
+
+    @staticmethod
+    def _estimate_tokens(text: str) -> int:
+        """Rough token estimate (~4 characters per token) for the per-minute token budget."""
+        return len(text) // 4 + 1
+
+    @staticmethod
+    def _extract_prompt(data) -> str:
+        """Pulls the prompt text out of an agent input (object, dict, or anything printable)."""
         prompt = getattr(data, "prompt", None)
         if prompt is None and isinstance(data, dict):
             prompt = data.get("prompt")
         if prompt is None:
             prompt = str(data)
-        prompt = str(prompt)
-        logger.data({"prompt": prompt})
-        content = Content(role="user", parts=[Part(text=prompt)])
-        runner = Runner(agent=agent, app_name=self.app_name, session_service=self.session_service)
-         # ✅ Use synchronous generator instead of `run_async`
-        events = runner.run(user_id=user_id, session_id=session_id, new_message=content)
-
-        final_response = None
-        for event in events:
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if part.text:
-                        final_response = part.text
-        return {"result": final_response} 
\ No newline at end of file
+        return str(prompt)
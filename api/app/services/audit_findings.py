@@ -0,0 +1,43 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, List
+from app.infrastructure.db import mongodb
+
+class AuditFindingsCache:
+    """
+    Remediated findings per (document hash, control family), stored in `audit_findings`.
+    The fingerprint also covers the audit context, the prompt version and the model, so a
+    re-audit reuses a pair's findings only when none of its inputs changed.
+    """
+    @property
+    def collection(self):
+        return mongodb.db.audit_findings
+
+    @staticmethod
+    def fingerprint(doc_sha256: str, control_family: str, context: Dict[str, Any], findings_version: str, model: str) -> str:
+        material = json.dumps([doc_sha256, control_family, context, findings_version, model], sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get_many(self, fingerprints: List[str]) -> Dict[str, dict]:
+        if not fingerprints:
+            return {}
+        cursor = self.collection.find({"_id": {"$in": fingerprints}})
+        return {doc["_id"]: doc async for doc in cursor}
+
+    async def store(self, fingerprint: str, doc_sha256: str, control_family: str, findings_version: str, model: str, issues: List[Dict[str, Any]]):
+        await self.collection.replace_one(
+            {"_id": fingerprint},
+            {
+                "_id": fingerprint,
+                "doc_sha256": doc_sha256,
+                "control_family": control_family,
+                "findings_version": findings_version,
+                "model": model,
+                "issues": issues,
+                "created_at": datetime.utcnow(),
+            },
+            upsert=True
+        )
+
+audit_findings = AuditFindingsCache()
@@ -0,0 +1,282 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from pymongo import ReturnDocument
+from app.core.config import settings
+from app.infrastructure.db import mongodb
+from app.infrastructure.logger import Logger
+from app.infrastructure.registry import registry
+
+logger = Logger(__name__)
+
+UNFINISHED = ["queued", "running"]
+
+_worker_id: Optional[str] = None
+_worker_pid: Optional[int] = None
+
+def worker_id() -> str:
+    """Identifies this process as a job owner; unique per process, even across restarts."""
+    global _worker_id, _worker_pid
+    if _worker_pid != os.getpid():
+        _worker_pid = os.getpid()
+        _worker_id = f"{socket.gethostname()}:{_worker_pid}:{uuid.uuid4().hex[:8]}"
+    return _worker_id
+
+class JobLeased(Exception):
+    """The job is running under another owner's unexpired lease."""
+
+class AuditJobStore:
+    """
+    Audit jobs persisted in the `audit_jobs` collection.
+    A job moves queued -> running -> completed | failed; `stage` and `checkpoint` record
+    progress inside a run so a redelivered job resumes instead of starting over.
+    A running job is leased to its `owner`, which keeps `updated_at` fresh with heartbeats;
+    once that is older than AUDIT_JOB_LEASE_SECONDS another process may claim the job.
+    """
+    @property
+    def collection(self):
+        return mongodb.db.audit_jobs
+
+    @staticmethod
+    def _lease_cutoff() -> datetime:
+        return datetime.utcnow() - timedelta(seconds=settings.AUDIT_JOB_LEASE_SECONDS)
+
+    async def create(self, user_id: str, session_id: str, params: Dict[str, Any], doc_ids: List[str], backend: str = "local") -> dict:
+        now = datetime.utcnow()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "session_id": session_id,
+            "backend": backend,
+            "owner": None,
+            "status": "queued",
+            "stage": "uploaded",
+            "params": params,
+            "doc_ids": doc_ids,
+            "checkpoint": {},
+            "result": None,
+            "error": None,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.collection.insert_one(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"_id": job_id})
+
+    async def start(self, job_id: str, owner: str) -> Optional[dict]:
+        """
+        Claims a job for `owner`, marks it running and returns it. Returns None if it does not
+        exist or already finished; raises JobLeased if another owner's lease has not expired.
+        """
+        now = datetime.utcnow()
+        job = await self.collection.find_one_and_update(
+            {
+                "_id": job_id,
+                "status": {"$in": UNFINISHED},
+                "$or": [{"owner": None}, {"owner": owner}, {"updated_at": {"$lt": self._lease_cutoff()}}],
+            },
+            {
+                "$set": {"status": "running", "owner": owner, "started_at": now, "updated_at": now},
+                "$inc": {"attempts": 1},
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if job is None and await self.collection.count_documents({"_id": job_id, "status": {"$in": UNFINISHED}}, limit=1):
+            raise JobLeased(job_id)
+        return job
+
+    async def heartbeat(self, job_ids: List[str], owner: str):
+        """Renews `owner`'s lease on these jobs (and keeps unclaimed queued ones from going stale)."""
+        await self.collection.update_many(
+            {"_id": {"$in": job_ids}, "status": {"$in": UNFINISHED}, "owner": {"$in": [owner, None]}},
+            {"$set": {"updated_at": datetime.utcnow()}}
+        )
+
+    async def claim_stale(self, backend: str, owner: str) -> Optional[dict]:
+        """
+        Atomically takes over one unfinished job of `backend` whose lease expired, e.g. because
+        the process running it died. Jobs from before backends were recorded count as local.
+        """
+        backends = [backend, None] if backend == "local" else [backend]
+        return await self.collection.find_one_and_update(
+            {"backend": {"$in": backends}, "status": {"$in": UNFINISHED}, "updated_at": {"$lt": self._lease_cutoff()}},
+            {"$set": {"owner": owner, "updated_at": datetime.utcnow()}},
+            projection={"_id": 1, "attempts": 1},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def set_stage(self, job_id: str, stage: str):
+        await self.collection.update_one({"_id": job_id}, {"$set": {"stage": stage, "updated_at": datetime.utcnow()}})
+
+    async def save_checkpoint(self, job_id: str, checkpoint: Dict[str, Any]):
+        await self.collection.update_one({"_id": job_id}, {"$set": {"checkpoint": checkpoint, "updated_at": datetime.utcnow()}})
+
+    async def complete(self, job_id: str, result: Dict[str, Any]):
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "completed", "stage": "completed", "result": result, "error": None, "finished_at": now, "updated_at": now}}
+        )
+
+    async def fail(self, job_id: str, error: str):
+        now = datetime.utcnow()
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "failed", "error": error, "finished_at": now, "updated_at": now}}
+        )
+
+    async def fail_unfinished(self, job_ids: List[str], owner: str, error: str):
+        """Fails the jobs among `job_ids` that are still queued or running and not leased to someone else."""
+        now = datetime.utcnow()
+        await self.collection.update_many(
+            {"_id": {"$in": job_ids}, "status": {"$in": UNFINISHED}, "owner": {"$in": [owner, None]}},
+            {"$set": {"status": "failed", "error": error, "finished_at": now, "updated_at": now}}
+        )
+
+audit_job_store = AuditJobStore()
+
+async def _heartbeat(store: AuditJobStore, job_ids: List[str], owner: str):
+    while True:
+        await asyncio.sleep(max(1, settings.AUDIT_JOB_LEASE_SECONDS // 4))
+        try:
+            await store.heartbeat(job_ids, owner)
+        except Exception as e:
+            logger.warning(f"Audit job heartbeat failed: {e}")
+
+async def execute_audit_job(job_id: str, orchestrator, store: AuditJobStore = audit_job_store, owner: Optional[str] = None):
+    """
+    Runs one queued audit job to completion, resuming from its last checkpoint, and holds
+    its lease while it runs. Raises JobLeased if another process is running it.
+    """
+    owner = owner or worker_id()
+    job = await store.start(job_id, owner)
+    if job is None:
+        logger.warning(f"Audit job {job_id} not found or already finished; skipping.")
+        return
+
+    async def progress(event: str, data: Dict[str, Any]):
+        if event == "stage":
+            await store.set_stage(job_id, data["stage"])
+        elif event == "checkpoint":
+            await store.save_checkpoint(job_id, data)
+
+    heartbeat = asyncio.create_task(_heartbeat(store, [job_id], owner))
+    try:
+        result = await orchestrator.audit_documents(
+            **job["params"],
+            doc_ids=job["doc_ids"],
+            user_id=job["user_id"],
+            session_id=job["session_id"],
+            progress=progress,
+            checkpoint=job.get("checkpoint")
+        )
+    except Exception as e:
+        logger.error(f"Audit job {job_id} failed: {e}")
+        await store.fail(job_id, str(e))
+        return
+    finally:
+        heartbeat.cancel()
+    await store.complete(job_id, result)
+
+class LocalAuditJobQueue:
+    """
+    Runs jobs as tasks on the API's own event loop, AUDIT_JOB_CONCURRENCY at a time.
+    Needs no broker. Jobs still queued or running when the process shuts down are failed;
+    jobs whose process died are taken over by recover() once their lease expires.
+    """
+    backend = "local"
+
+    def __init__(self, concurrency: int = settings.AUDIT_JOB_CONCURRENCY, store: AuditJobStore = audit_job_store):
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.store = store
+        self.tasks: Dict[asyncio.Task, str] = {}
+        self.background: List[asyncio.Task] = []
+
+    async def submit(self, job_id: str):
+        task = asyncio.create_task(self._run(job_id))
+        self.tasks[task] = job_id
+        task.add_done_callback(lambda done: self.tasks.pop(done, None))
+
+    async def _run(self, job_id: str):
+        async with self.semaphore:
+            try:
+                await execute_audit_job(job_id, registry.audit_orchestrator, self.store, worker_id())
+            except JobLeased:
+                logger.info(f"Audit job {job_id} was taken over by another process; skipping.")
+
+    async def recover(self):
+        """
+        Starts the background tasks: a heartbeat that keeps this process's queued jobs from
+        looking abandoned, and a sweep that takes over local jobs whose lease expired (their
+        process crashed) and re-submits them. A job that already used AUDIT_JOB_MAX_ATTEMPTS
+        runs is failed instead.
+        """
+        self.background = [asyncio.create_task(self._heartbeat_queued()), asyncio.create_task(self._sweep())]
+
+    async def _heartbeat_queued(self):
+        while True:
+            await asyncio.sleep(max(1, settings.AUDIT_JOB_LEASE_SECONDS // 4))
+            if self.tasks:
+                try:
+                    await self.store.heartbeat(list(self.tasks.values()), worker_id())
+                except Exception as e:
+                    logger.warning(f"Audit job heartbeat failed: {e}")
+
+    async def _sweep(self):
+        while True:
+            try:
+                resubmitted = 0
+                while True:
+                    job = await self.store.claim_stale(self.backend, worker_id())
+                    if job is None:
+                        break
+                    if job.get("attempts", 0) >= settings.AUDIT_JOB_MAX_ATTEMPTS:
+                        await self.store.fail(job["_id"], "Interrupted too many times; please run the audit again.")
+                        continue
+                    await self.submit(job["_id"])
+                    resubmitted += 1
+                if resubmitted:
+                    logger.info(f"Re-submitted {resubmitted} interrupted audit jobs.")
+            except Exception as e:
+                logger.warning(f"Audit job recovery failed: {e}")
+            await asyncio.sleep(max(1, settings.AUDIT_JOB_LEASE_SECONDS // 2))
+
+    async def shutdown(self):
+        for task in self.background:
+            task.cancel()
+        job_ids = list(self.tasks.values())
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.background, *self.tasks, return_exceptions=True)
+        if job_ids:
+            await self.store.fail_unfinished(job_ids, worker_id(), "Interrupted by a server shutdown; please run the audit again.")
+
+class CeleryAuditJobQueue:
+    """Sends jobs to the Celery workers in `app.worker` through the REDIS_URL broker."""
+    backend = "celery"
+
+    async def submit(self, job_id: str):
+        from app.worker import run_audit_job
+        # delay() talks to the broker synchronously
+        await asyncio.to_thread(run_audit_job.delay, job_id)
+
+    async def recover(self):
+        # Unacknowledged tasks are redelivered by the broker
+        pass
+
+    async def shutdown(self):
+        pass
+
+def build_job_queue():
+    """Picks the job queue from AUDIT_JOB_BACKEND ("local" or "celery")."""
+    if settings.AUDIT_JOB_BACKEND == "celery":
+        return CeleryAuditJobQueue()
+    return LocalAuditJobQueue()
+
+audit_job_queue = build_job_queue()
@@ -0,0 +1,207 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from app.infrastructure.db import mongodb
+from app.infrastructure.logger import Logger
+
+logger = Logger(__name__)
+
+SEVERITIES = ("High", "Medium", "Low")
+ISSUE_FIELDS = ("index", "severity", "description", "recommendation", "control_family", "document_id")
+RUN_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+BACKFILL_MIGRATION = "audits_from_gridfs"
+
+def stored_issues(issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{key: issue[key] for key in ISSUE_FIELDS if key in issue} for issue in issues]
+
+def result_version(score: Optional[int], issues: List[Dict[str, Any]]) -> str:
+    """Hash of an audit's stored result; rendered reports are cached per result version."""
+    material = json.dumps({"score": score, "issues": stored_issues(issues)}, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+class AuditStore:
+    """
+    Structured audit results in the `audits` collection, one document per audit.
+    History and analytics are indexed queries on (user_id, project_id, created_at).
+    """
+    @property
+    def collection(self):
+        return mongodb.db.audits
+
+    async def save(
+        self,
+        audit_id: str,
+        pdf_id: Optional[str],
+        pdf_url: str,
+        user_id: str,
+        project_id: Optional[str],
+        company_name: str,
+        audit_type: str,
+        audit_scope: str,
+        control_families: list,
+        doc_ids: List[str],
+        score: int,
+        issues: List[Dict[str, Any]],
+        timings: Dict[str, float],
+        models: Dict[str, str]
+    ) -> str:
+        """
+        Upserts the audit (idempotent for a resumed job) and returns its id. `pdf_id` is
+        set only when the PDF was rendered during the audit rather than on first request.
+        """
+        counts = {severity: 0 for severity in SEVERITIES}
+        for issue in issues:
+            if issue.get("severity") in counts:
+                counts[issue["severity"]] += 1
+        overall_severity = next((severity for severity in SEVERITIES if counts[severity]), "None")
+        stored = stored_issues(issues)
+        fields = {
+            "user_id": str(user_id),
+            "project_id": project_id,
+            "company_name": company_name,
+            "audit_type": audit_type,
+            "audit_scope": audit_scope,
+            "control_families": list(control_families),
+            "doc_ids": [str(doc_id) for doc_id in doc_ids],
+            "score": score,
+            "overall_severity": overall_severity,
+            "issue_counts": counts,
+            "issues": stored,
+            "result_version": result_version(score, stored),
+            "pdf_url": pdf_url,
+            "timings": timings,
+            "models": models,
+        }
+        if pdf_id:
+            fields["pdf_id"] = pdf_id
+        await self.collection.update_one(
+            {"_id": ObjectId(audit_id)},
+            {"$set": fields, "$setOnInsert": {"created_at": datetime.utcnow()}},
+            upsert=True
+        )
+        return audit_id
+
+    async def get(self, audit_id: str) -> Optional[dict]:
+        try:
+            oid = ObjectId(audit_id)
+        except (InvalidId, TypeError):
+            return None
+        return await self.collection.find_one({"_id": oid})
+
+    async def replace_pdf(self, audit_id: str, old_pdf_id: str, new_pdf_id: str) -> bool:
+        """
+        Points the audit at a re-rendered PDF in one update. The old id is kept in
+        `replaced_pdf_ids` so links to it still resolve. Returns False if the audit's
+        pdf_id is no longer `old_pdf_id`.
+        """
+        result = await self.collection.update_one(
+            {"_id": ObjectId(audit_id), "pdf_id": old_pdf_id},
+            {
+                "$set": {"pdf_id": new_pdf_id, "pdf_url": f"/api/v1/audit/pdf/{new_pdf_id}"},
+                "$addToSet": {"replaced_pdf_ids": old_pdf_id},
+            }
+        )
+        return result.modified_count == 1
+
+    async def find_by_replaced_pdf(self, pdf_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"replaced_pdf_ids": pdf_id})
+
+    @staticmethod
+    def _match(user_id: str, project_id: Optional[str]) -> dict:
+        match = {"user_id": str(user_id)}
+        if project_id:
+            match["project_id"] = project_id
+        return match
+
+    async def history(self, user_id: str, project_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """History rows, newest first, shaped and date-formatted by the database."""
+        pipeline = [
+            {"$match": self._match(user_id, project_id)},
+            {"$sort": {"created_at": -1}},
+            {"$project": {
+                "_id": 0,
+                "audit_id": {"$toString": "$_id"},
+                "company_name": {"$ifNull": ["$company_name", "N/A"]},
+                "run_date": {"$dateToString": {"format": RUN_DATE_FORMAT, "date": "$created_at"}},
+                "score": {"$ifNull": ["$score", "N/A"]},
+                "pdf_url": 1,
+                "project_id": 1,
+            }},
+        ]
+        return await self.collection.aggregate(pipeline).to_list(length=None)
+
+    async def summary(self, user_id: str, project_id: Optional[str] = None) -> Dict[str, Any]:
+        """Audit count, score statistics and issue totals per severity."""
+        pipeline = [
+            {"$match": self._match(user_id, project_id)},
+            {"$group": {
+                "_id": None,
+                "audits": {"$sum": 1},
+                "average_score": {"$avg": "$score"},
+                "min_score": {"$min": "$score"},
+                "max_score": {"$max": "$score"},
+                "last_run": {"$max": "$created_at"},
+                **{f"{severity.lower()}_issues": {"$sum": f"$issue_counts.{severity}"} for severity in SEVERITIES},
+            }},
+            {"$project": {"_id": 0}},
+        ]
+        rows = await self.collection.aggregate(pipeline).to_list(1)
+        return rows[0] if rows else {"audits": 0}
+
+    async def backfill_from_gridfs(self) -> int:
+        """
+        Adds an `audits` entry (without issues) for every report generated before this
+        collection existed, from the GridFS file metadata. Runs once: a completed pass is
+        recorded in `migrations`, so later startups skip the scan. Safe to run repeatedly.
+        """
+        try:
+            if await mongodb.db.migrations.find_one({"_id": BACKFILL_MIGRATION}, {"_id": 1}):
+                return 0
+            backfilled = await self._backfill_from_gridfs()
+            await mongodb.db.migrations.update_one(
+                {"_id": BACKFILL_MIGRATION},
+                {"$set": {"completed_at": datetime.utcnow(), "backfilled": backfilled}},
+                upsert=True
+            )
+            return backfilled
+        except Exception as e:
+            logger.warning(f"Audit backfill from GridFS failed: {e}")
+            return 0
+
+    async def _backfill_from_gridfs(self) -> int:
+        # Reports rendered since this collection exists carry their audit id and already have an entry
+        cursor = mongodb.db.fs.files.find(
+            {"metadata.type": "generated", "metadata.audit_id": {"$exists": False}},
+            {"uploadDate": 1, "metadata": 1}
+        )
+        operations = []
+        async for file_doc in cursor:
+            metadata = file_doc.get("metadata") or {}
+            pdf_id = str(file_doc["_id"])
+            score = metadata.get("score")
+            operations.append(UpdateOne(
+                {"pdf_id": pdf_id},
+                {"$setOnInsert": {
+                    "pdf_id": pdf_id,
+                    "user_id": str(metadata.get("user_id")),
+                    "project_id": metadata.get("project_id"),
+                    "company_name": metadata.get("company_name"),
+                    "score": score if isinstance(score, int) else None,
+                    "pdf_url": f"/api/v1/audit/pdf/{pdf_id}",
+                    "created_at": file_doc.get("uploadDate"),
+                    "legacy": True,
+                }},
+                upsert=True
+            ))
+        if not operations:
+            return 0
+        result = await self.collection.bulk_write(operations, ordered=False)
+        if result.upserted_count:
+            logger.info(f"Backfilled {result.upserted_count} audits from GridFS report metadata.")
+        return result.upserted_count
+
+audit_store = AuditStore()
@@ -0,0 +1,68 @@
+import json
+import re
+from typing import Any, List
+
+class JSONArrayStreamParser:
+    """
+    Incrementally extracts the elements of one named JSON array (e.g. `"issues": [...]`)
+    from text that arrives in chunks, so each element can be used as soon as it is complete.
+    Surrounding prose and markdown fences are ignored; only object and array elements are returned.
+    """
+    def __init__(self, key: str):
+        self.key_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self.buffer = ""
+        self.pos = 0
+        self.found = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.element_start = None
+        self.skipped = 0
+
+    def feed(self, text: str) -> List[Any]:
+        """Adds a chunk of text and returns the array elements completed by it."""
+        self.buffer += text
+        items = []
+        if self.done:
+            return items
+        if not self.found:
+            match = self.key_re.search(self.buffer)
+            if not match:
+                return items
+            self.found = True
+            self.pos = match.end()
+
+        buffer = self.buffer
+        i = self.pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                if self.depth == 0:
+                    self.element_start = i
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 0:
+                    # End of the array itself
+                    self.done = True
+                    i += 1
+                    break
+                self.depth -= 1
+                if self.depth == 0 and self.element_start is not None:
+                    try:
+                        items.append(json.loads(buffer[self.element_start:i + 1]))
+                    except json.JSONDecodeError:
+                        self.skipped += 1
+                    self.element_start = None
+            i += 1
+        self.pos = i
+        return items
@@ -0,0 +1,187 @@
+import ast
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+from datetime import datetime
+from typing import AsyncGenerator, List, Optional
+from app.core.config import settings
+
+LIVE_MODES = ("live", "record")
+OBJECT_ID_RE = re.compile(r"\b[0-9a-f]{24}\b")
+SYNTHETIC_STREAM_CHUNKS = 8
+
+class LLMBackend:
+    """
+    Pluggable stand-in for the model behind ADKClient and VertexAIClient.
+    - live: real Gemini/Vertex calls (default).
+    - synthetic: deterministic, schema-valid JSON for each agent with a configurable latency distribution.
+    - record: real calls, with every reply written to a cassette file.
+    - replay: replies served from cassette files; missing cassettes raise LookupError.
+    In synthetic and replay mode the scanner's get_document_content tool is still called for
+    every document ID in the prompt, so document loading is exercised as in a live run.
+    Synthetic mode charges one extra model turn of latency for the tool calls: like a live model
+    issuing parallel function calls, it requests every document in a single turn.
+    """
+    def __init__(
+        self,
+        mode: str = settings.LLM_BACKEND,
+        cassette_dir: str = settings.LLM_CASSETTE_DIR,
+        latency_distribution: str = settings.LLM_SYNTHETIC_LATENCY_DISTRIBUTION,
+        latency_mean_ms: float = settings.LLM_SYNTHETIC_LATENCY_MEAN_MS,
+        latency_jitter_ms: float = settings.LLM_SYNTHETIC_LATENCY_JITTER_MS,
+        seed: int = settings.LLM_SYNTHETIC_SEED,
+    ):
+        self.mode = mode
+        self.cassette_dir = cassette_dir
+        self.latency_distribution = latency_distribution
+        self.latency_mean_ms = latency_mean_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.random = random.Random(seed)
+
+    @property
+    def is_live(self) -> bool:
+        return self.mode in LIVE_MODES
+
+    @staticmethod
+    def cassette_key(agent_name: str, instruction: str, prompt: str) -> str:
+        # Document IDs change on every upload; normalize them so a replayed audit still matches
+        normalized = OBJECT_ID_RE.sub("<id>", prompt)
+        material = json.dumps([agent_name, instruction, normalized])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _cassette_path(self, key: str) -> str:
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+    async def generate(self, agent_name: str, instruction: str, prompt: str, tools: Optional[list] = None) -> str:
+        """Returns the stand-in reply text for one agent call (synthetic or replay mode)."""
+        await self._call_document_tools(prompt, tools or [])
+        if self.mode == "replay":
+            return await self._replay(agent_name, instruction, prompt)
+        await asyncio.sleep(self._sample_latency())
+        return self._synthesize(agent_name, prompt)
+
+    async def generate_stream(self, agent_name: str, instruction: str, prompt: str, tools: Optional[list] = None) -> AsyncGenerator[str, None]:
+        """
+        Streamed variant of `generate`. Synthetic mode spreads the sampled latency over the
+        chunks so consumers see a first token early, as with a live streaming reply.
+        """
+        await self._call_document_tools(prompt, tools or [])
+        if self.mode == "replay":
+            yield await self._replay(agent_name, instruction, prompt)
+            return
+        text = self._synthesize(agent_name, prompt)
+        chunk_size = max(1, len(text) // SYNTHETIC_STREAM_CHUNKS + 1)
+        delay = self._sample_latency() / SYNTHETIC_STREAM_CHUNKS
+        for start in range(0, len(text), chunk_size):
+            await asyncio.sleep(delay)
+            yield text[start:start + chunk_size]
+
+    async def record(self, agent_name: str, instruction: str, prompt: str, response: Optional[str]):
+        """Writes a live reply to its cassette file (record mode only)."""
+        if self.mode != "record" or response is None:
+            return
+        key = self.cassette_key(agent_name, instruction, prompt)
+        cassette = {
+            "agent_name": agent_name,
+            "instruction": instruction,
+            "prompt": prompt,
+            "response": response,
+            "recorded_at": datetime.utcnow().isoformat(),
+        }
+        await asyncio.to_thread(self._write_cassette, self._cassette_path(key), cassette)
+
+    @staticmethod
+    def _write_cassette(path: str, cassette: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(cassette, f, indent=2)
+
+    async def _replay(self, agent_name: str, instruction: str, prompt: str) -> str:
+        path = self._cassette_path(self.cassette_key(agent_name, instruction, prompt))
+        if not os.path.exists(path):
+            raise LookupError(f"No cassette recorded for agent '{agent_name}' at {path}")
+        cassette = await asyncio.to_thread(self._read_cassette, path)
+        return cassette["response"]
+
+    @staticmethod
+    def _read_cassette(path: str) -> dict:
+        with open(path, "r") as f:
+            return json.load(f)
+
+    async def _call_document_tools(self, prompt: str, tools: list):
+        document_tools = [tool for tool in tools if getattr(tool, "__name__", None) == "get_document_content"]
+        if not document_tools:
+            return
+        file_ids = OBJECT_ID_RE.findall(prompt)
+        if file_ids and self.mode == "synthetic":
+            # The model spends one turn emitting the (parallel) function calls before it can analyze
+            await asyncio.sleep(self._sample_latency())
+        await asyncio.gather(*[document_tools[0](file_id) for file_id in file_ids])
+
+    def _sample_latency(self) -> float:
+        mean, jitter = self.latency_mean_ms, self.latency_jitter_ms
+        if self.latency_distribution == "uniform":
+            latency = self.random.uniform(mean - jitter, mean + jitter)
+        elif self.latency_distribution == "normal":
+            latency = self.random.gauss(mean, jitter)
+        elif self.latency_distribution == "lognormal" and mean > 0:
+            # Long-tailed like real model latency; jitter is the spread around the median
+            latency = mean * self.random.lognormvariate(0, jitter / mean)
+        else:
+            latency = mean
+        return max(0.0, latency) / 1000
+
+    def _synthesize(self, agent_name: str, prompt: str) -> str:
+        # Seed on the ID-normalized prompt so re-uploaded documents give the same reply
+        normalized = OBJECT_ID_RE.sub("<id>", prompt)
+        seed = int(hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:8], 16)
+        if agent_name == "compliance_scanner":
+            payload = {"issues": self._synthetic_issues(prompt, seed)}
+        elif agent_name == "remediation_suggestor" and '"recommendations"' in prompt:
+            indexes = [int(index) for index in re.findall(r"^(\d+)\. \[Severity:", prompt, re.MULTILINE)]
+            payload = {"recommendations": [
+                {"index": index, "recommendation": f"Synthetic remediation for issue {index}: document and enforce the missing control."}
+                for index in indexes
+            ]}
+        elif agent_name == "remediation_suggestor":
+            payload = {"recommendation": "Synthetic remediation: document the missing control, assign an owner and review it quarterly."}
+        elif agent_name == "query_deconstructor":
+            payload = {"sub_questions": [f"Synthetic sub-question {i + 1}" for i in range(1 + seed % 3)]}
+        elif agent_name == "regulation_finder":
+            match = re.search(r"Questions to Research:\*\*\s*\n(.*?)\n\s*\n", prompt, re.DOTALL)
+            block = match.group(1) if match else ""
+            questions = [line.strip().lstrip("- ") for line in block.splitlines() if line.strip()] or ["Synthetic question"]
+            payload = {"results": [
+                {"source": f"https://example.com/regulation/{i + 1}", "content": f"Synthetic finding for: {question}"}
+                for i, question in enumerate(questions)
+            ]}
+        elif agent_name == "synthesizer":
+            payload = {"explanation": "Synthetic explanation assembled from the research findings."}
+        else:
+            return f"Synthetic response from {agent_name}."
+        return f"```json\n{json.dumps(payload, indent=2)}\n```"
+
+    @staticmethod
+    def _synthetic_issues(prompt: str, seed: int) -> List[dict]:
+        families = ["General"]
+        match = re.search(r"Control Families to Audit Against:\*\*\s*\n(.+)", prompt)
+        if match:
+            try:
+                parsed = ast.literal_eval(match.group(1).strip())
+                families = [str(family) for family in parsed] or families
+            except (ValueError, SyntaxError):
+                families = [match.group(1).strip()]
+        severities = ["High", "Medium", "Low"]
+        return [
+            {
+                "severity": severities[(seed + i) % len(severities)],
+                "description": f"Synthetic gap {i + 1}: no explicit evidence of required {families[i % len(families)]} controls."
+            }
+            for i in range(len(families) + seed % 3)
+        ]
+
+# Shared by every ADKClient/VertexAIClient in the process
+llm_backend = LLMBackend()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional, List
+from app.core.config import settings
+from app.infrastructure.db import mongodb
+from app.infrastructure.logger import Logger
+
+logger = Logger(__name__)
+
+class LLMResponseCache:
+    """
+    Content-addressed cache for agent responses.
+    - Keys are a SHA-256 over model, agent name, instruction, tool names and prompt.
+    - First tier is an in-process LRU with TTL; second tier is the `llm_cache` Mongo collection.
+    - Agents listed in LLM_CACHE_BYPASS_AGENTS are never cached.
+    """
+    def __init__(
+        self,
+        enabled: bool = settings.LLM_CACHE_ENABLED,
+        max_entries: int = settings.LLM_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = settings.LLM_CACHE_TTL_SECONDS,
+        persistent: bool = settings.LLM_CACHE_PERSISTENT,
+        bypass_agents: Optional[List[str]] = None,
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        if bypass_agents is None:
+            bypass_agents = [name.strip() for name in settings.LLM_CACHE_BYPASS_AGENTS.split(",") if name.strip()]
+        self.bypass_agents = set(bypass_agents)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def is_enabled_for(self, agent_name: str) -> bool:
+        if not self.enabled:
+            return False
+        if agent_name in self.bypass_agents:
+            self.bypassed += 1
+            return False
+        return True
+
+    @staticmethod
+    def make_key(model: str, agent_name: str, instruction: str, tools: Optional[list], prompt: str) -> str:
+        tool_names = sorted(
+            getattr(tool, "name", None) or getattr(tool, "__name__", None) or type(tool).__name__
+            for tool in (tools or [])
+        )
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        material = json.dumps([model, agent_name, instruction, tool_names, prompt_hash])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self.persistent and mongodb.db is not None:
+            try:
+                doc = await mongodb.db.llm_cache.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+            except Exception as e:
+                logger.warning(f"LLM cache lookup failed: {e}")
+                doc = None
+            if doc:
+                self._remember(key, doc["value"])
+                self.hits += 1
+                self.persistent_hits += 1
+                return doc["value"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, agent_name: str, value: dict):
+        self._remember(key, value)
+        if self.persistent and mongodb.db is not None:
+            try:
+                await mongodb.db.llm_cache.update_one(
+                    {"_id": key},
+                    {"$set": {
+                        "agent_name": agent_name,
+                        "value": value,
+                        "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds),
+                    }},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"LLM cache write failed: {e}")
+
+    def _remember(self, key: str, value: dict):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
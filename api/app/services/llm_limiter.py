@@ -0,0 +1,219 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, TypeVar
+from app.core.config import settings
+from app.infrastructure.logger import Logger
+
+logger = Logger(__name__)
+
+T = TypeVar("T")
+
+RATE_LIMIT_MARKERS = ("429", "RESOURCE_EXHAUSTED", "rate limit", "quota")
+TRANSIENT_MARKERS = ("500", "502", "503", "504", "UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL")
+RATE_LIMIT_ERRORS = {"ResourceExhausted", "TooManyRequests"}
+TRANSIENT_ERRORS = {"ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "GatewayTimeout", "TimeoutError"}
+
+def classify_error(exc: Exception) -> Optional[str]:
+    """Returns "rate_limit", "transient" or None (not retryable) for an LLM client exception."""
+    name = type(exc).__name__
+    code = getattr(exc, "code", None)
+    text = str(exc)
+    if name in RATE_LIMIT_ERRORS or code == 429 or any(marker in text for marker in RATE_LIMIT_MARKERS):
+        return "rate_limit"
+    if name in TRANSIENT_ERRORS or code in (500, 502, 503, 504) or any(marker in text for marker in TRANSIENT_MARKERS):
+        return "transient"
+    return None
+
+class TokenBucket:
+    """Per-minute budget refilled continuously. A rate of 0 disables the bucket."""
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0):
+        if self.capacity <= 0:
+            return
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class AgentStats:
+    def __init__(self):
+        self.queued = 0
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "avg_wait_seconds": round(self.wait_seconds_total / self.requests, 4) if self.requests else 0.0,
+            "max_wait_seconds": round(self.max_wait_seconds, 4),
+        }
+
+class AdaptiveLimiter:
+    """
+    Shared limiter for every LLM call made by the ADK service layer.
+    - Concurrency follows AIMD: +1 slot per window of successful calls, halved on a rate-limit error.
+    - Token buckets cap requests and estimated tokens per minute.
+    - Rate-limit and transient errors are retried with full-jitter exponential backoff.
+    """
+    def __init__(
+        self,
+        initial_concurrency: int = settings.LLM_INITIAL_CONCURRENCY,
+        min_concurrency: int = settings.LLM_MIN_CONCURRENCY,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        requests_per_minute: int = settings.LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = settings.LLM_TOKENS_PER_MINUTE,
+        max_retries: int = settings.LLM_MAX_RETRIES,
+        retry_base_delay: float = settings.LLM_RETRY_BASE_DELAY,
+        retry_max_delay: float = settings.LLM_RETRY_MAX_DELAY,
+    ):
+        self.min_concurrency = max(1, min_concurrency)
+        self.max_concurrency = max(self.min_concurrency, max_concurrency)
+        self.limit = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+        self._last_decrease = 0.0
+        self._agents: Dict[str, AgentStats] = {}
+
+    def _stats(self, agent_name: str) -> AgentStats:
+        if agent_name not in self._agents:
+            self._agents[agent_name] = AgentStats()
+        return self._agents[agent_name]
+
+    async def _acquire(self, agent_name: str, estimated_tokens: int):
+        stats = self._stats(agent_name)
+        stats.queued += 1
+        start = time.monotonic()
+        try:
+            async with self._condition:
+                await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+                self.in_flight += 1
+        finally:
+            stats.queued -= 1
+        stats.in_flight += 1
+        try:
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimated_tokens)
+        except BaseException:
+            await self._release(agent_name, outcome=None)
+            raise
+        waited = time.monotonic() - start
+        stats.requests += 1
+        stats.wait_seconds_total += waited
+        stats.max_wait_seconds = max(stats.max_wait_seconds, waited)
+
+    async def _release(self, agent_name: str, outcome: Optional[str]):
+        """Frees a slot. `outcome` is "success", "rate_limit", or None to leave the limit unchanged."""
+        self._stats(agent_name).in_flight -= 1
+        async with self._condition:
+            self.in_flight -= 1
+            if outcome == "rate_limit":
+                # One decrease per burst: concurrent 429s from the same window count once
+                now = time.monotonic()
+                if now - self._last_decrease > self.retry_base_delay:
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+                    self._last_decrease = now
+                    logger.warning(f"LLM rate limited; concurrency limit lowered to {int(self.limit)}")
+            elif outcome == "success":
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    async def run(self, agent_name: str, call: Callable[[], Awaitable[T]], estimated_tokens: int = 0) -> T:
+        """Runs `call` under the limiter, retrying rate-limit and transient failures."""
+        attempt = 0
+        while True:
+            await self._acquire(agent_name, estimated_tokens)
+            try:
+                result = await call()
+            except Exception as e:
+                kind = classify_error(e)
+                await self._release(agent_name, outcome=kind if kind == "rate_limit" else None)
+                stats = self._stats(agent_name)
+                if kind == "rate_limit":
+                    stats.rate_limited += 1
+                attempt += 1
+                delay = self.retry_delay(agent_name, e, attempt)
+                if delay is None:
+                    stats.errors += 1
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled mid-call: give the slot back without touching the limit
+                await self._release(agent_name, outcome=None)
+                raise
+            await self._release(agent_name, outcome="success")
+            return result
+
+    def retry_delay(self, agent_name: str, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Backoff before retry number `attempt` (from 1) of a call that failed with `error`,
+        or None when the error is not retryable or the retries are used up.
+        """
+        kind = classify_error(error)
+        if kind is None or attempt > self.max_retries:
+            return None
+        self._stats(agent_name).retries += 1
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        logger.warning(f"{agent_name}: {kind} error ({error}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+        return delay
+
+    @asynccontextmanager
+    async def slot(self, agent_name: str, estimated_tokens: int = 0) -> AsyncIterator[None]:
+        """
+        Holds one slot for the whole body, for streamed calls that `run` cannot wrap.
+        The slot does not retry; callers retry with `retry_delay` while nothing has been consumed.
+        """
+        await self._acquire(agent_name, estimated_tokens)
+        try:
+            yield
+        except Exception as e:
+            kind = classify_error(e)
+            await self._release(agent_name, outcome="rate_limit" if kind == "rate_limit" else None)
+            stats = self._stats(agent_name)
+            if kind == "rate_limit":
+                stats.rate_limited += 1
+            stats.errors += 1
+            raise
+        except BaseException:
+            await self._release(agent_name, outcome=None)
+            raise
+        await self._release(agent_name, outcome="success")
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "agents": {name: stats.as_dict() for name, stats in self._agents.items()},
+        }
+
+# Shared by every ADKClient/VertexAIClient in the process
+llm_limiter = AdaptiveLimiter()
@@ -1,10 +1,15 @@
 import os
-from typing import List, Optional, AsyncGenerator
+import time
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, AsyncGenerator
 from PyPDF2 import PdfReader
 from io import BytesIO
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
-from tempfile import NamedTemporaryFile
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 from bson import ObjectId
@@ -12,171 +17,389 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.lib.colors import HexColor
+from app.core.config import settings
+from app.infrastructure.logger import Logger
+
+logger = Logger(__name__)
+
+# Bump whenever text extraction changes so cached extractions are re-parsed
+PDF_PARSER_VERSION = "pypdf2-3.0"
+
+_extraction_pool: Optional[ProcessPoolExecutor] = None
+
+# GridFS default chunk size; uploads are written in pieces of this size
+GRIDFS_CHUNK_SIZE = 255 * 1024
+
+def get_extraction_pool() -> Optional[ProcessPoolExecutor]:
+    """Returns the shared extraction process pool, or None when PDF_EXTRACTION_WORKERS < 0."""
+    global _extraction_pool
+    if settings.PDF_EXTRACTION_WORKERS < 0:
+        return None
+    if _extraction_pool is None:
+        workers = settings.PDF_EXTRACTION_WORKERS or os.cpu_count() or 1
+        # Spawn rather than fork: the parent runs an event loop and driver threads
+        _extraction_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _extraction_pool
+
+def shutdown_extraction_pool():
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(wait=False, cancel_futures=True)
+        _extraction_pool = None
+
+def _count_pages(data: bytes) -> int:
+    return len(PdfReader(BytesIO(data)).pages)
+
+def _extract_page_range(data: bytes, start: int, end: Optional[int]) -> List[str]:
+    """Worker: returns the text of pages[start:end]."""
+    pages = PdfReader(BytesIO(data)).pages
+    end = len(pages) if end is None else min(end, len(pages))
+    return [pages[i].extract_text() or "" for i in range(start, end)]
+
+def parse_document_pages(data: bytes) -> List[str]:
+    """Returns the text of each page. Non-PDF uploads are decoded as a single page of text."""
+    if not data.startswith(b"%PDF"):
+        return [data.decode("utf-8", errors="replace")]
+    return _extract_page_range(data, 0, None)
+
+async def parse_document_pages_async(data: bytes) -> List[str]:
+    """
+    Parses a document off the event loop. Large PDFs are split into page ranges of at least
+    PDF_PAGES_PER_TASK pages that are extracted in parallel across the process pool.
+    Every task is sent the whole PDF and re-reads its structure, so the number of ranges is
+    capped at the worker count: a file is pickled at most once per worker.
+    """
+    if not data.startswith(b"%PDF"):
+        return [data.decode("utf-8", errors="replace")]
+
+    pool = get_extraction_pool()
+    if pool is None:
+        return await asyncio.to_thread(parse_document_pages, data)
+
+    loop = asyncio.get_running_loop()
+    # Reading the page tree is cheap next to text extraction; a thread avoids copying the bytes
+    page_count = await asyncio.to_thread(_count_pages, data)
+    workers = settings.PDF_EXTRACTION_WORKERS or os.cpu_count() or 1
+    step = max(1, settings.PDF_PAGES_PER_TASK, -(-page_count // workers))
+    ranges = await asyncio.gather(*[
+        loop.run_in_executor(pool, _extract_page_range, data, start, start + step)
+        for start in range(0, page_count, step)
+    ])
+    return [page for range_pages in ranges for page in range_pages]
+
+async def get_cached_extraction(db: AsyncIOMotorDatabase, sha256: str) -> Optional[dict]:
+    """Looks up a stored extraction for these document bytes at the current parser version."""
+    return await db.document_texts.find_one({"_id": sha256, "parser_version": PDF_PARSER_VERSION})
+
+async def store_extraction(db: AsyncIOMotorDatabase, sha256: str, pages: List[str], extraction_seconds: Optional[float] = None) -> None:
+    """Stores the per-page text of a document, keyed by the SHA-256 of its bytes."""
+    await db.document_texts.replace_one(
+        {"_id": sha256},
+        {
+            "_id": sha256,
+            "parser_version": PDF_PARSER_VERSION,
+            "pages": pages,
+            "page_count": len(pages),
+            "char_count": sum(len(page) for page in pages),
+            "extraction_seconds": extraction_seconds,
+            "created_at": datetime.utcnow(),
+        },
+        upsert=True
+    )
+
+async def ensure_extraction(db: AsyncIOMotorDatabase, sha256: str, data: bytes, label: str = "") -> List[str]:
+    """Returns the per-page text for these bytes, parsing and storing it only if not cached yet."""
+    cached = await get_cached_extraction(db, sha256)
+    if cached:
+        return cached["pages"]
+    start = time.perf_counter()
+    pages = await parse_document_pages_async(data)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Extracted {len(pages)} pages ({len(data)} bytes) from {label or sha256} in {elapsed:.2f}s")
+    await store_extraction(db, sha256, pages, extraction_seconds=elapsed)
+    return pages
 
 async def extract_pdf_content(db: AsyncIOMotorDatabase, file_id: str) -> str:
     """
     Extracts all text content from a PDF file stored in GridFS.
+    Extractions are cached in `document_texts` by content hash, so a document that was
+    already parsed (in this run or an earlier audit) costs a single indexed lookup.
     """
     try:
+        oid = ObjectId(file_id)
+        file_doc = await db.fs.files.find_one({"_id": oid}, {"metadata.sha256": 1})
+        sha256 = ((file_doc or {}).get("metadata") or {}).get("sha256")
+        if sha256:
+            cached = await get_cached_extraction(db, sha256)
+            if cached:
+                return "".join(cached["pages"])
+
         fs = AsyncIOMotorGridFSBucket(db)
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
+        grid_out = await fs.open_download_stream(oid)
         
         # Read stream into an in-memory buffer for PyPDF2
         pdf_bytes = await grid_out.read()
-        pdf_buffer = BytesIO(pdf_bytes)
-        
-        reader = PdfReader(pdf_buffer)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() or ""
-        return text
+        if not sha256:
+            sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+            await db.fs.files.update_one({"_id": oid}, {"$set": {"metadata.sha256": sha256}})
+
+        pages = await ensure_extraction(db, sha256, pdf_bytes, label=file_id)
+        return "".join(pages)
     except Exception as e:
         # Log the exception properly in a real app
         return f"Error extracting PDF content for file_id {file_id}: {e}"
 
-def generate_pdf_report(
-    sections: Optional[List[dict]],
-    score: Optional[int],
-    issues: Optional[List[dict]],
-    overall_severity: str,
-    output_dir: Optional[str] = None
-) -> str:
-    """
-    Generates a professional, multi-page PDF report from audit data using ReportLab Platypus.
-    Handles text wrapping, page breaks, and styling automatically.
-    Returns the file path to the generated PDF.
-    """
-    if output_dir is None:
-        output_dir = os.getcwd()
-
-    with NamedTemporaryFile(delete=False, suffix=".pdf", dir=output_dir) as tmpfile:
-        doc = SimpleDocTemplate(tmpfile.name, pagesize=letter)
-        story = []
-        styles = getSampleStyleSheet()
-
-        # --- Modify existing styles ---
-        styles['Title'].fontName = 'Helvetica-Bold'
-        styles['Title'].fontSize = 24
-        styles['Title'].leading = 28
-        styles['Title'].spaceAfter = 20
-        styles['Title'].alignment = TA_CENTER
-        styles['Title'].textColor = HexColor('#1E293B')
-
-        styles['h2'].fontName = 'Helvetica-Bold'
-        styles['h2'].fontSize = 16
-        styles['h2'].leading = 20
-        styles['h2'].spaceBefore = 10
-        styles['h2'].spaceAfter = 10
-        styles['h2'].textColor = HexColor('#334155')
-        
-        styles['h3'].fontName = 'Helvetica-Bold'
-        styles['h3'].fontSize = 14
-        styles['h3'].leading = 18
-        styles['h3'].spaceBefore = 8
-        styles['h3'].spaceAfter = 8
-        styles['h3'].textColor = HexColor('#475569')
-
-        styles['BodyText'].fontName = 'Helvetica'
-        styles['BodyText'].fontSize = 11
-        styles['BodyText'].leading = 14
-        styles['BodyText'].spaceAfter = 12
-
-        # --- Modify the 'Code' style which also exists by default ---
-        styles.add(ParagraphStyle(
-            name='CodeBlock',
-            parent=styles['BodyText'],
-            fontName='Courier',
-            fontSize=10,
-            leading=12,
-            leftIndent=20,
-            rightIndent=20,
-            spaceBefore=6,
-            spaceAfter=12,
-            textColor=HexColor('#334155'),
-            backColor=HexColor('#F1F5F9'),
-            borderPadding=5,
-        ))
+SEVERITY_COLORS = {
+    "High": HexColor('#EF4444'),    # Red-500
+    "Medium": HexColor('#F97316'), # Orange-500
+    "Low": HexColor('#EAB308'),     # Yellow-500
+    "None": HexColor('#22C55E'),    # Green-500
+}
 
-        # --- Define Score Color based on Severity ---
-        severity_colors = {
-            "High": HexColor('#EF4444'),    # Red-500
-            "Medium": HexColor('#F97316'), # Orange-500
-            "Low": HexColor('#EAB308'),     # Yellow-500
-            "None": HexColor('#22C55E'),    # Green-500
-        }
-        score_color = severity_colors.get(overall_severity, HexColor('#64748B')) # Default to Slate-500
-        
+_report_styles = None
+_render_pool: Optional[ProcessPoolExecutor] = None
+
+def build_report_styles():
+    """Builds the report stylesheet, including one score style per severity."""
+    styles = getSampleStyleSheet()
+
+    # --- Modify existing styles ---
+    styles['Title'].fontName = 'Helvetica-Bold'
+    styles['Title'].fontSize = 24
+    styles['Title'].leading = 28
+    styles['Title'].spaceAfter = 20
+    styles['Title'].alignment = TA_CENTER
+    styles['Title'].textColor = HexColor('#1E293B')
+
+    styles['h2'].fontName = 'Helvetica-Bold'
+    styles['h2'].fontSize = 16
+    styles['h2'].leading = 20
+    styles['h2'].spaceBefore = 10
+    styles['h2'].spaceAfter = 10
+    styles['h2'].textColor = HexColor('#334155')
+    
+    styles['h3'].fontName = 'Helvetica-Bold'
+    styles['h3'].fontSize = 14
+    styles['h3'].leading = 18
+    styles['h3'].spaceBefore = 8
+    styles['h3'].spaceAfter = 8
+    styles['h3'].textColor = HexColor('#475569')
+
+    styles['BodyText'].fontName = 'Helvetica'
+    styles['BodyText'].fontSize = 11
+    styles['BodyText'].leading = 14
+    styles['BodyText'].spaceAfter = 12
+
+    # --- Modify the 'Code' style which also exists by default ---
+    styles.add(ParagraphStyle(
+        name='CodeBlock',
+        parent=styles['BodyText'],
+        fontName='Courier',
+        fontSize=10,
+        leading=12,
+        leftIndent=20,
+        rightIndent=20,
+        spaceBefore=6,
+        spaceAfter=12,
+        textColor=HexColor('#334155'),
+        backColor=HexColor('#F1F5F9'),
+        borderPadding=5,
+    ))
+
+    # --- Score color based on severity (default to Slate-500) ---
+    for severity, color in list(SEVERITY_COLORS.items()) + [("Default", HexColor('#64748B'))]:
         styles.add(ParagraphStyle(
-            name='Score',
+            name=f'Score{severity}',
             parent=styles['h2'],
             alignment=TA_CENTER,
-            textColor=score_color
+            textColor=color
         ))
+    return styles
 
-        # --- Build the story ---
-        story.append(Paragraph("Compliance Audit Report", styles['Title']))
+def get_report_styles():
+    """Returns the report stylesheet, built once per process (so once per render worker)."""
+    global _report_styles
+    if _report_styles is None:
+        _report_styles = build_report_styles()
+    return _report_styles
+
+def build_report_story(
+    sections: Optional[List[dict]],
+    score: Optional[int],
+    issues: Optional[List[dict]],
+    overall_severity: str
+) -> list:
+    """Builds the Platypus flowables of an audit report."""
+    styles = get_report_styles()
+    score_style = styles[f'Score{overall_severity}' if overall_severity in SEVERITY_COLORS else 'ScoreDefault']
+    story = []
 
-        if score is not None:
-            story.append(Paragraph(f"Overall Compliance Score: {score} / 100", styles['Score']))
+    # --- Build the story ---
+    story.append(Paragraph("Compliance Audit Report", styles['Title']))
 
-        story.append(Spacer(1, 24))
-        story.append(Paragraph("Summary of Findings", styles['h2']))
-        
-        if not sections:
-            story.append(Paragraph("No sections were provided for this report.", styles['BodyText']))
-        else:
-            for section in sections:
-                flag = "✅" if not section.get('flagged') else "❌"
-                title = f"{flag} {section.get('title', 'Untitled Section')}"
-                story.append(Paragraph(title, styles['h3']))
-                
-                content_text = section.get('content', '').replace('\n', '<br/>')
-                story.append(Paragraph(content_text, styles['BodyText']))
-                story.append(Spacer(1, 12))
-
-        story.append(PageBreak())
-        story.append(Paragraph("Detailed Issues & Recommendations", styles['h2']))
-
-        if not issues:
-            story.append(Paragraph("No compliance issues were identified during this audit.", styles['BodyText']))
-        else:
-            for issue in issues:
-                issue_title = f"Issue: {issue.get('description', 'N/A')}"
-                severity = f"Severity: {issue.get('severity', 'N/A')}"
-                recommendation = issue.get('recommendation', 'No recommendation provided.')
-
-                story.append(Paragraph(issue_title, styles['h3']))
-                story.append(Paragraph(severity, styles['BodyText']))
-                story.append(Paragraph("Recommendation:", styles['h3']))
-                story.append(Paragraph(recommendation.replace('\n', '<br/>'), styles['CodeBlock']))
-                story.append(Spacer(1, 24))
-        
-        doc.build(story)
-        return tmpfile.name
+    if score is not None:
+        story.append(Paragraph(f"Overall Compliance Score: {score} / 100", score_style))
+
+    story.append(Spacer(1, 24))
+    story.append(Paragraph("Summary of Findings", styles['h2']))
+    
+    if not sections:
+        story.append(Paragraph("No sections were provided for this report.", styles['BodyText']))
+    else:
+        for section in sections:
+            flag = "✅" if not section.get('flagged') else "❌"
+            title = f"{flag} {section.get('title', 'Untitled Section')}"
+            story.append(Paragraph(title, styles['h3']))
+            
+            content_text = section.get('content', '').replace('\n', '<br/>')
+            story.append(Paragraph(content_text, styles['BodyText']))
+            story.append(Spacer(1, 12))
+
+    story.append(PageBreak())
+    story.append(Paragraph("Detailed Issues & Recommendations", styles['h2']))
+
+    if not issues:
+        story.append(Paragraph("No compliance issues were identified during this audit.", styles['BodyText']))
+    else:
+        for issue in issues:
+            issue_title = f"Issue: {issue.get('description', 'N/A')}"
+            severity = f"Severity: {issue.get('severity', 'N/A')}"
+            recommendation = issue.get('recommendation', 'No recommendation provided.')
+
+            story.append(Paragraph(issue_title, styles['h3']))
+            story.append(Paragraph(severity, styles['BodyText']))
+            story.append(Paragraph("Recommendation:", styles['h3']))
+            story.append(Paragraph(recommendation.replace('\n', '<br/>'), styles['CodeBlock']))
+            story.append(Spacer(1, 24))
+    return story
+
+def render_pdf_report(
+    sections: Optional[List[dict]],
+    score: Optional[int],
+    issues: Optional[List[dict]],
+    overall_severity: str
+) -> bytes:
+    """Renders the audit report in memory and returns the PDF bytes."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc.build(build_report_story(sections, score, issues, overall_severity))
+    return buffer.getvalue()
 
-async def save_pdf_stream_to_db(db: AsyncIOMotorDatabase, file_stream: AsyncGenerator, filename: str, metadata: Optional[dict] = None) -> str:
+def get_render_pool() -> Optional[ProcessPoolExecutor]:
+    """Returns the shared report rendering process pool, or None when PDF_RENDER_WORKERS < 0."""
+    global _render_pool
+    if settings.PDF_RENDER_WORKERS < 0:
+        return None
+    if _render_pool is None:
+        workers = settings.PDF_RENDER_WORKERS or os.cpu_count() or 1
+        _render_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _render_pool
+
+def shutdown_render_pool():
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+async def render_pdf_report_async(
+    sections: Optional[List[dict]],
+    score: Optional[int],
+    issues: Optional[List[dict]],
+    overall_severity: str
+) -> bytes:
+    """Runs `render_pdf_report` in the render process pool so the event loop keeps serving."""
+    pool = get_render_pool()
+    if pool is None:
+        return await asyncio.to_thread(render_pdf_report, sections, score, issues, overall_severity)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, render_pdf_report, sections, score, issues, overall_severity)
+
+async def save_document_with_extraction(db: AsyncIOMotorDatabase, file_obj, filename: str, metadata: Optional[dict] = None, extract: bool = True) -> str:
     """
-    Saves a file stream to MongoDB GridFS. Returns the file id as a string.
+    Uploads a document to GridFS and extracts its text in the same step.
+    The GridFS upload and the (process pool) parse run concurrently, and the extraction is
+    stored under the content hash recorded in the file metadata, so later
+    `get_document_content` tool calls are pure lookups. Returns the file id as a string.
+    With extract=False only the upload is done and the text is extracted on first use.
     """
+    data = await asyncio.to_thread(file_obj.read)
+    sha256 = hashlib.sha256(data).hexdigest()
     fs = AsyncIOMotorGridFSBucket(db)
-    file_id = await fs.upload_from_stream(filename, file_stream, metadata=metadata)
+
+    async def run_extraction():
+        if not extract:
+            return
+        try:
+            await ensure_extraction(db, sha256, data, label=filename)
+        except Exception as e:
+            # The scanner tool retries extraction lazily; never fail the upload over it
+            logger.warning(f"Upload-time extraction failed for {filename}: {e}")
+
+    file_id, _ = await asyncio.gather(
+        fs.upload_from_stream(filename, BytesIO(data), metadata={**(metadata or {}), "sha256": sha256}),
+        run_extraction()
+    )
     return str(file_id)
 
-async def save_pdf_file_to_db(db: AsyncIOMotorDatabase, file_path: str, filename: str, metadata: Optional[dict] = None) -> str:
+async def get_document_hashes(db: AsyncIOMotorDatabase, file_ids: List[str]) -> Dict[str, str]:
+    """Returns {file_id: sha256} for the GridFS files whose content hash is recorded."""
+    cursor = db.fs.files.find({"_id": {"$in": [ObjectId(str(file_id)) for file_id in file_ids]}}, {"metadata.sha256": 1})
+    hashes = {}
+    async for doc in cursor:
+        sha256 = (doc.get("metadata") or {}).get("sha256")
+        if sha256:
+            hashes[str(doc["_id"])] = sha256
+    return hashes
+
+async def get_document_sizes(db: AsyncIOMotorDatabase, file_ids: List[str]) -> Dict[str, int]:
     """
-    Saves a local file to MongoDB GridFS. Returns the file id as a string.
+    Returns {file_id: estimated text size in characters} without parsing anything: the character
+    count of the cached extraction, or the stored file size for documents not extracted yet.
     """
-    fs = AsyncIOMotorGridFSBucket(db)
-    with open(file_path, "rb") as f:
-        file_id = await fs.upload_from_stream(filename, f, metadata=metadata)
-    return str(file_id)
+    cursor = db.fs.files.find({"_id": {"$in": [ObjectId(str(file_id)) for file_id in file_ids]}}, {"length": 1, "metadata.sha256": 1})
+    files = {str(doc["_id"]): doc async for doc in cursor}
+    hashes = {file_id: (doc.get("metadata") or {}).get("sha256") for file_id, doc in files.items()}
+    extracted = db.document_texts.find(
+        {"_id": {"$in": [sha256 for sha256 in hashes.values() if sha256]}, "parser_version": PDF_PARSER_VERSION},
+        {"char_count": 1}
+    )
+    char_counts = {doc["_id"]: doc.get("char_count") async for doc in extracted}
+    sizes = {}
+    for file_id, doc in files.items():
+        char_count = char_counts.get(hashes[file_id])
+        sizes[file_id] = char_count if char_count is not None else doc.get("length", 0)
+    return sizes
 
-async def get_pdf_from_db(db: AsyncIOMotorDatabase, file_id: str) -> bytes:
+async def save_pdf_bytes_to_db(db: AsyncIOMotorDatabase, data: bytes, filename: str, metadata: Optional[dict] = None) -> str:
     """
-    Retrieve a PDF file from MongoDB GridFS by file id. Returns the file bytes.
+    Uploads an in-memory PDF to GridFS one chunk at a time, recording its size and
+    SHA-256 in the file metadata. Returns the file id as a string.
     """
     fs = AsyncIOMotorGridFSBucket(db)
-    stream = await fs.open_download_stream(ObjectId(file_id))
-    data = await stream.read()
-    stream.close()
-    return data 
\ No newline at end of file
+    metadata = {**(metadata or {}), "size": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+    grid_in = fs.open_upload_stream(filename, chunk_size_bytes=GRIDFS_CHUNK_SIZE, metadata=metadata)
+    try:
+        for offset in range(0, len(data), GRIDFS_CHUNK_SIZE):
+            await grid_in.write(data[offset:offset + GRIDFS_CHUNK_SIZE])
+    except Exception:
+        await grid_in.abort()
+        raise
+    await grid_in.close()
+    return str(grid_in._id)
+
+async def iter_gridfs_range(grid_out, start: int, end: int) -> AsyncGenerator[bytes, None]:
+    """
+    Yields bytes `start`..`end` (inclusive) of an open GridFS file one chunk at a time,
+    then closes it, so memory per download does not depend on the file size.
+    """
+    try:
+        grid_out.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = await grid_out.read(min(grid_out.chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        grid_out.close()
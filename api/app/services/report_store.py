@@ -0,0 +1,122 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from app.infrastructure.db import mongodb
+from app.services.audit_store import audit_store
+from app.services.pdf_tools import save_pdf_bytes_to_db
+
+class ReportStore:
+    """
+    Rendered reports cached in GridFS, one file per (audit, format, result version, layout version).
+    A format is rendered the first time it is requested; a new result or layout version misses
+    the cache, and the stale files of that audit and format are removed once the new one is stored.
+    """
+    def __init__(self):
+        self.inflight: Dict[tuple, asyncio.Task] = {}
+
+    async def find(self, audit_id: str, report_format: str, result_version: str, layout_version: str) -> Optional[str]:
+        """Returns the GridFS id of the cached report, if any."""
+        file_doc = await mongodb.db.fs.files.find_one(
+            {
+                "metadata.audit_id": audit_id,
+                "metadata.format": report_format,
+                "metadata.result_version": result_version,
+                "metadata.layout_version": layout_version,
+            },
+            {"_id": 1},
+            sort=[("uploadDate", -1)]
+        )
+        return str(file_doc["_id"]) if file_doc else None
+
+    async def materialize(
+        self,
+        audit: Dict[str, Any],
+        report_format: str,
+        layout_version: str,
+        filename: str,
+        render: Callable[[], Awaitable[bytes]]
+    ) -> str:
+        """
+        Returns the GridFS id of the cached report, rendering and caching it first if needed,
+        so callers can stream it. Concurrent first requests for the same report share one render.
+        """
+        audit_id = str(audit["_id"])
+        file_id = await self.find(audit_id, report_format, audit.get("result_version"), layout_version)
+        if file_id:
+            return file_id
+
+        key = (audit_id, report_format, audit.get("result_version"), layout_version)
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._render_and_store(audit, report_format, layout_version, filename, render))
+            self.inflight[key] = task
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        # A client that goes away must not cancel the render other requests are waiting on
+        return await asyncio.shield(task)
+
+    async def _render_and_store(
+        self,
+        audit: Dict[str, Any],
+        report_format: str,
+        layout_version: str,
+        filename: str,
+        render: Callable[[], Awaitable[bytes]]
+    ) -> str:
+        data = await render()
+        return await self.store(audit, report_format, layout_version, filename, data)
+
+    async def store(self, audit: Dict[str, Any], report_format: str, layout_version: str, filename: str, data: bytes, replace_id: Optional[str] = None) -> str:
+        """
+        Caches a rendered report, replacing older renderings of the same format. Returns the file id.
+        With `replace_id` (the audit's pdf_id, a PDF rendered during the audit) the new rendering
+        takes over that file's metadata and the audit is pointed at it before the old file is
+        deleted, so the audit always references a complete file; links to the old id are
+        resolved through the audit's `replaced_pdf_ids`.
+        """
+        audit_id = str(audit["_id"])
+        metadata = {
+            "user_id": audit.get("user_id"),
+            "project_id": audit.get("project_id"),
+            "type": "report",
+        }
+        if replace_id:
+            existing = await mongodb.db.fs.files.find_one({"_id": ObjectId(replace_id)}, {"metadata": 1})
+            if existing:
+                metadata.update(existing.get("metadata") or {})
+        metadata.update({
+            "audit_id": audit_id,
+            "format": report_format,
+            "result_version": audit.get("result_version"),
+            "layout_version": layout_version,
+        })
+        file_id = await save_pdf_bytes_to_db(mongodb.db, data, filename, metadata=metadata)
+        fs = AsyncIOMotorGridFSBucket(mongodb.db)
+        if replace_id:
+            if not await audit_store.replace_pdf(audit_id, replace_id, file_id):
+                await fs.delete(ObjectId(file_id))
+                raise RuntimeError(f"Audit {audit_id} no longer references PDF {replace_id}")
+            try:
+                await fs.delete(ObjectId(replace_id))
+            except NoFile:
+                pass
+        await self._delete_stale(audit_id, report_format, file_id)
+        return file_id
+
+    async def _delete_stale(self, audit_id: str, report_format: str, keep_id: str):
+        # Only lazily rendered reports; a PDF rendered during the audit is referenced by its pdf_id
+        cursor = mongodb.db.fs.files.find(
+            {
+                "metadata.type": "report",
+                "metadata.audit_id": audit_id,
+                "metadata.format": report_format,
+                "_id": {"$ne": ObjectId(keep_id)},
+            },
+            {"_id": 1}
+        )
+        fs = AsyncIOMotorGridFSBucket(mongodb.db)
+        async for file_doc in cursor:
+            await fs.delete(file_doc["_id"])
+
+report_store = ReportStore()
@@ -0,0 +1,135 @@
+import asyncio
+import math
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from app.core.config import settings
+from app.services.pdf_tools import extract_pdf_content, PDF_PARSER_VERSION
+
+# Bump whenever chunking or tokenization changes so persisted chunks are rebuilt
+CHUNKER_VERSION = "1"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is", "it", "of",
+    "on", "or", "that", "the", "this", "to", "was", "were", "will", "with", "all", "any", "must", "should",
+}
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_RE.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+def chunk_text(text: str, chunk_chars: int = settings.RETRIEVAL_CHUNK_CHARS, overlap_chars: int = settings.RETRIEVAL_CHUNK_OVERLAP) -> List[str]:
+    """
+    Splits text into chunks of roughly `chunk_chars`, breaking on paragraph or line
+    boundaries where possible and carrying `overlap_chars` of context between chunks.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + chunk_chars)
+        if end < len(text):
+            # Prefer a paragraph break, then a line break, in the second half of the window
+            for separator in ("\n\n", "\n", ". "):
+                boundary = text.rfind(separator, start + chunk_chars // 2, end)
+                if boundary != -1:
+                    end = boundary + len(separator)
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return chunks
+
+async def load_document_chunks(db: AsyncIOMotorDatabase, file_id: str) -> Dict:
+    """
+    Returns the persisted chunks and per-chunk term frequencies of a GridFS document,
+    building them on first use. Chunks are stored in `document_chunks` by content hash,
+    so a document re-uploaded in a later audit is not re-chunked.
+    """
+    file_doc = await db.fs.files.find_one({"_id": ObjectId(file_id)}, {"metadata.sha256": 1})
+    sha256 = ((file_doc or {}).get("metadata") or {}).get("sha256")
+    if sha256:
+        stored = await db.document_chunks.find_one({
+            "_id": sha256,
+            "parser_version": PDF_PARSER_VERSION,
+            "chunker_version": CHUNKER_VERSION,
+        })
+        if stored:
+            return stored
+
+    # extract_pdf_content also back-fills the content hash for older uploads
+    text = await extract_pdf_content(db, file_id)
+    chunks = chunk_text(text)
+    entry = {
+        "chunks": chunks,
+        "term_freqs": [dict(Counter(tokenize(chunk))) for chunk in chunks],
+    }
+    if not sha256:
+        file_doc = await db.fs.files.find_one({"_id": ObjectId(file_id)}, {"metadata.sha256": 1})
+        sha256 = ((file_doc or {}).get("metadata") or {}).get("sha256")
+    if sha256 and not text.startswith("Error extracting"):
+        await db.document_chunks.replace_one(
+            {"_id": sha256},
+            {
+                "_id": sha256,
+                "parser_version": PDF_PARSER_VERSION,
+                "chunker_version": CHUNKER_VERSION,
+                **entry,
+                "created_at": datetime.utcnow(),
+            },
+            upsert=True
+        )
+    return entry
+
+class BM25Index:
+    """In-memory inverted BM25 index over the chunks of one audit's documents."""
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.passages: List[Dict] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+
+    def add_document(self, doc_id: str, chunks: List[str], term_freqs: List[Dict[str, int]]):
+        for index, (chunk, freqs) in enumerate(zip(chunks, term_freqs)):
+            passage_id = len(self.passages)
+            self.passages.append({"doc_id": doc_id, "chunk": index, "text": chunk})
+            self.lengths.append(sum(freqs.values()))
+            for term, count in freqs.items():
+                self.postings.setdefault(term, {})[passage_id] = count
+
+    def search(self, query: str, top_k: int = 5, doc_ids: Optional[Set[str]] = None) -> List[Dict]:
+        """Top passages for the query, optionally only from the given documents (statistics stay index-wide)."""
+        if not self.passages:
+            return []
+        total = len(self.passages)
+        avg_length = (sum(self.lengths) / total) or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, count in postings.items():
+                if doc_ids is not None and self.passages[passage_id]["doc_id"] not in doc_ids:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[passage_id] / avg_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [{**self.passages[passage_id], "score": round(score, 4)} for passage_id, score in ranked]
+
+async def build_audit_index(db: AsyncIOMotorDatabase, doc_ids: List[str]) -> BM25Index:
+    """Builds the BM25 index for an audit from the persisted chunks of each document."""
+    entries = await asyncio.gather(*[load_document_chunks(db, str(doc_id)) for doc_id in doc_ids])
+    index = BM25Index()
+    for doc_id, entry in zip(doc_ids, entries):
+        index.add_document(str(doc_id), entry["chunks"], entry["term_freqs"])
+    return index
@@ -0,0 +1,302 @@
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Optional
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from app.core.config import settings
+from app.infrastructure.db import mongodb
+
+def trim_events(events: list, max_events: int) -> list:
+    """
+    Keeps at most `max_events` of the newest events, starting the kept history on a user turn
+    so a function response is never left without the call that produced it.
+    """
+    if max_events <= 0 or len(events) <= max_events:
+        return events
+    cut = len(events) - max_events
+    while cut < len(events) and getattr(events[cut], "author", None) != "user":
+        cut += 1
+    return events[cut:]
+
+def estimate_event_tokens(event: Event) -> int:
+    """Rough token estimate (~4 characters per token) of an event's text and tool payloads."""
+    size = 0
+    if event.content and event.content.parts:
+        for part in event.content.parts:
+            if part.text:
+                size += len(part.text)
+            if part.function_call:
+                size += len(str(part.function_call.args or {}))
+            if part.function_response:
+                size += len(str(part.function_response.response or {}))
+    return size // 4 + 1
+
+def compact_events(events: list, token_budget: int) -> list:
+    """
+    Keeps the newest events whose combined estimated size fits in `token_budget`,
+    starting the kept history on a user turn. A budget <= 0 disables compaction.
+    """
+    if token_budget <= 0 or not events:
+        return events
+    used = 0
+    start = len(events)
+    while start > 0:
+        used += estimate_event_tokens(events[start - 1])
+        if used > token_budget:
+            break
+        start -= 1
+    while start < len(events) and getattr(events[start], "author", None) != "user":
+        start += 1
+    return events[start:]
+
+def _text_size(events: list) -> int:
+    size = 0
+    for event in events:
+        if event.content and event.content.parts:
+            for part in event.content.parts:
+                if part.text:
+                    size += len(part.text)
+    return size
+
+class BoundedInMemorySessionService(InMemorySessionService):
+    """
+    InMemorySessionService with LRU/TTL eviction and a per-session event cap,
+    so long-running workers keep flat memory.
+    """
+    def __init__(
+        self,
+        max_sessions: int = settings.SESSION_MAX_SESSIONS,
+        ttl_seconds: int = settings.SESSION_TTL_SECONDS,
+        max_events: int = settings.SESSION_MAX_EVENTS,
+    ):
+        super().__init__()
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_events = max_events
+        # (app_name, user_id, session_id) -> last access time, oldest first
+        self._last_access: "OrderedDict[tuple, float]" = OrderedDict()
+        self.evicted = 0
+        self.events_trimmed = 0
+        self.events_compacted = 0
+
+    def _touch(self, app_name: str, user_id: str, session_id: str):
+        key = (app_name, user_id, session_id)
+        self._last_access[key] = time.monotonic()
+        self._last_access.move_to_end(key)
+
+    async def _evict(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._last_access:
+            key, last_access = next(iter(self._last_access.items()))
+            if last_access >= cutoff and len(self._last_access) <= self.max_sessions:
+                break
+            del self._last_access[key]
+            app_name, user_id, session_id = key
+            await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+            self.evicted += 1
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None, session_id: Optional[str] = None) -> Session:
+        session = await super().create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        self._touch(app_name, user_id, session.id)
+        await self._evict()
+        return session
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        await self._evict()
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        if session is not None:
+            self._touch(app_name, user_id, session_id)
+        return session
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._last_access.pop((app_name, user_id, session_id), None)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        stored = self.sessions.get(session.app_name, {}).get(session.user_id, {}).get(session.id)
+        if stored is not None:
+            trimmed = trim_events(stored.events, self.max_events)
+            if len(trimmed) < len(stored.events):
+                self.events_trimmed += len(stored.events) - len(trimmed)
+                stored.events = trimmed
+            self._touch(session.app_name, session.user_id, session.id)
+        return event
+
+    async def compact_history(self, *, app_name: str, user_id: str, session_id: str, token_budget: int) -> int:
+        """Drops the oldest events beyond `token_budget`. Returns the number of events dropped."""
+        stored = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None:
+            return 0
+        compacted = compact_events(stored.events, token_budget)
+        dropped = len(stored.events) - len(compacted)
+        if dropped:
+            stored.events = compacted
+            self.events_compacted += dropped
+        return dropped
+
+    async def discard_events_since(self, *, app_name: str, user_id: str, session_id: str, timestamp: float) -> int:
+        """Drops the events appended at or after `timestamp`. Returns the number of events dropped."""
+        stored = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None:
+            return 0
+        kept = [event for event in stored.events if event.timestamp < timestamp]
+        dropped = len(stored.events) - len(kept)
+        stored.events = kept
+        return dropped
+
+    async def stats(self) -> dict:
+        sessions = [
+            session
+            for users in self.sessions.values()
+            for user_sessions in users.values()
+            for session in user_sessions.values()
+        ]
+        return {
+            "backend": "memory",
+            "sessions": len(sessions),
+            "max_sessions": self.max_sessions,
+            "events": sum(len(session.events) for session in sessions),
+            "max_events_per_session": self.max_events,
+            "approx_text_bytes": sum(_text_size(session.events) for session in sessions),
+            "evicted": self.evicted,
+            "events_trimmed": self.events_trimmed,
+            "events_compacted": self.events_compacted,
+        }
+
+class MongoSessionService(BaseSessionService):
+    """
+    Session backend persisted in the `adk_sessions` collection.
+    Sessions expire through a TTL index on `updated_at`; event history is capped per session.
+    """
+    def __init__(self, max_events: int = settings.SESSION_MAX_EVENTS):
+        self.max_events = max_events
+        self.events_compacted = 0
+
+    @property
+    def collection(self):
+        return mongodb.db.adk_sessions
+
+    @staticmethod
+    def _doc_id(app_name: str, user_id: str, session_id: str) -> str:
+        return f"{app_name}:{user_id}:{session_id}"
+
+    def _to_session(self, doc: dict) -> Session:
+        events = [Event.model_validate(event) for event in doc.get("events", [])]
+        return Session(
+            id=doc["session_id"],
+            app_name=doc["app_name"],
+            user_id=doc["user_id"],
+            state=doc.get("state", {}),
+            events=trim_events(events, self.max_events),
+            last_update_time=doc.get("last_update_time", 0.0),
+        )
+
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[dict[str, Any]] = None, session_id: Optional[str] = None) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        now = time.time()
+        doc = {
+            "_id": self._doc_id(app_name, user_id, session_id),
+            "app_name": app_name,
+            "user_id": user_id,
+            "session_id": session_id,
+            "state": state or {},
+            "events": [],
+            "last_update_time": now,
+            "updated_at": datetime.utcnow(),
+        }
+        await self.collection.replace_one({"_id": doc["_id"]}, doc, upsert=True)
+        return self._to_session(doc)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig] = None) -> Optional[Session]:
+        doc = await self.collection.find_one({"_id": self._doc_id(app_name, user_id, session_id)})
+        if not doc:
+            return None
+        session = self._to_session(doc)
+        if config and config.num_recent_events:
+            session.events = session.events[-config.num_recent_events:]
+        return session
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        cursor = self.collection.find({"app_name": app_name, "user_id": user_id}, {"events": 0})
+        sessions = [
+            Session(
+                id=doc["session_id"],
+                app_name=doc["app_name"],
+                user_id=doc["user_id"],
+                state=doc.get("state", {}),
+                last_update_time=doc.get("last_update_time", 0.0),
+            )
+            async for doc in cursor
+        ]
+        return ListSessionsResponse(sessions=sessions)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.collection.delete_one({"_id": self._doc_id(app_name, user_id, session_id)})
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        event = await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        push = {"$each": [event.model_dump(mode="json", exclude_none=True)]}
+        if self.max_events > 0:
+            push["$slice"] = -self.max_events
+        await self.collection.update_one(
+            {"_id": self._doc_id(session.app_name, session.user_id, session.id)},
+            {
+                "$push": {"events": push},
+                "$set": {
+                    "state": {key: value for key, value in session.state.items() if not key.startswith("temp:")},
+                    "last_update_time": event.timestamp,
+                    "updated_at": datetime.utcnow(),
+                },
+            }
+        )
+        return event
+
+    async def compact_history(self, *, app_name: str, user_id: str, session_id: str, token_budget: int) -> int:
+        """Drops the oldest events beyond `token_budget`. Returns the number of events dropped."""
+        doc_id = self._doc_id(app_name, user_id, session_id)
+        doc = await self.collection.find_one({"_id": doc_id}, {"events": 1})
+        if not doc:
+            return 0
+        events = [Event.model_validate(event) for event in doc.get("events", [])]
+        compacted = compact_events(events, token_budget)
+        dropped = len(events) - len(compacted)
+        if dropped:
+            await self.collection.update_one(
+                {"_id": doc_id},
+                {"$set": {"events": [event.model_dump(mode="json", exclude_none=True) for event in compacted]}}
+            )
+            self.events_compacted += dropped
+        return dropped
+
+    async def discard_events_since(self, *, app_name: str, user_id: str, session_id: str, timestamp: float) -> int:
+        """Drops the events appended at or after `timestamp`. Returns the number of events dropped."""
+        result = await self.collection.update_one(
+            {"_id": self._doc_id(app_name, user_id, session_id)},
+            {"$pull": {"events": {"timestamp": {"$gte": timestamp}}}}
+        )
+        return result.modified_count
+
+    async def stats(self) -> dict:
+        pipeline = [{"$group": {"_id": None, "sessions": {"$sum": 1}, "events": {"$sum": {"$size": "$events"}}}}]
+        totals = await self.collection.aggregate(pipeline).to_list(1)
+        totals = totals[0] if totals else {"sessions": 0, "events": 0}
+        return {
+            "backend": "mongo",
+            "sessions": totals["sessions"],
+            "events": totals["events"],
+            "max_events_per_session": self.max_events,
+            "events_compacted": self.events_compacted,
+        }
+
+def build_session_service() -> BaseSessionService:
+    """Picks the session backend from SESSION_BACKEND ("memory" or "mongo")."""
+    if settings.SESSION_BACKEND == "mongo":
+        return MongoSessionService()
+    return BoundedInMemorySessionService()
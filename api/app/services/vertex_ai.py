@@ -2,11 +2,18 @@ import vertexai
 from vertexai.generative_models import GenerativeModel
 import vertexai.generative_models as generative_models
 from app.core.config import settings
+from app.services.llm_limiter import llm_limiter
+from app.services.llm_backends import llm_backend
 
 class VertexAIClient:
     def __init__(self):
-        vertexai.init(project=settings.GCP_PROJECT_ID, location=settings.GCP_LOCATION)
-        self.model = GenerativeModel(settings.VERTEX_MODEL_NAME)
+        self.backend = llm_backend
+        if self.backend.is_live:
+            vertexai.init(project=settings.GCP_PROJECT_ID, location=settings.GCP_LOCATION)
+            self.model = GenerativeModel(settings.VERTEX_MODEL_NAME)
+        else:
+            # Offline stand-in: no credentials or network needed
+            self.model = None
         self.generation_config = {
             "max_output_tokens": settings.VERTEX_MAX_OUTPUT_TOKENS,
             "temperature": settings.VERTEX_TEMPERATURE,
@@ -20,10 +27,21 @@ class VertexAIClient:
         }
 
     async def analyze(self, prompt: str) -> str:
-        response = await self.model.generate_content_async(
-            [prompt],
-            generation_config=self.generation_config,
-            safety_settings=self.safety_settings,
-            stream=False,
+        if not self.backend.is_live:
+            return await llm_limiter.run(
+                "vertex_ai",
+                lambda: self.backend.generate("vertex_ai", "", prompt),
+                estimated_tokens=len(prompt) // 4 + 1
+            )
+        response = await llm_limiter.run(
+            "vertex_ai",
+            lambda: self.model.generate_content_async(
+                [prompt],
+                generation_config=self.generation_config,
+                safety_settings=self.safety_settings,
+                stream=False,
+            ),
+            estimated_tokens=len(prompt) // 4 + 1
         )
+        await self.backend.record("vertex_ai", "", prompt, response.text)
         return response.text 
\ No newline at end of file
@@ -0,0 +1,45 @@
+"""
+Celery worker for queued audit jobs (AUDIT_JOB_BACKEND=celery).
+
+    celery -A app.worker worker --loglevel=info
+
+Each worker process keeps one event loop with its own MongoDB client and AI client
+registry, so the shared LLM limiter and caches live across tasks as they do in the API.
+"""
+import asyncio
+from celery import Celery
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+from app.infrastructure.db import mongodb
+from app.infrastructure.registry import registry, _build_clients
+from app.services.audit_jobs import JobLeased, execute_audit_job
+
+celery_app = Celery("integra_ops", broker=settings.REDIS_URL)
+celery_app.conf.update(
+    # Acknowledge after the run so a job on a crashed worker is redelivered and resumes from its checkpoint
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+)
+
+_loop = None
+
+def _worker_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+        mongodb.client = AsyncIOMotorClient(settings.MONGODB_URL)
+        mongodb.db = mongodb.client[settings.DATABASE_NAME]
+        _build_clients()
+        registry.ready = True
+    return _loop
+
+@celery_app.task(name="audit.run_job", bind=True, max_retries=None)
+def run_audit_job(self, job_id: str):
+    loop = _worker_loop()
+    try:
+        loop.run_until_complete(execute_audit_job(job_id, registry.audit_orchestrator))
+    except JobLeased:
+        # Redelivered while the previous owner's lease is live: check again once it could have expired
+        raise self.retry(countdown=settings.AUDIT_JOB_LEASE_SECONDS)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: concurrent ADKClient.run_agent calls on a single event loop.
+
+Fires N agent calls at once against a simulated model with a fixed latency and
+reports wall-clock time plus the worst event loop stall seen by a heartbeat task.
+The LLM limiter is sized to N for the run (LLM_INITIAL_CONCURRENCY would otherwise
+cap it), so with a non-blocking client N concurrent calls finish in roughly one
+model latency; a blocking client serializes them and stalls the loop for the whole run.
+
+Usage: python benchmark_adk_concurrency.py [concurrency] [latency_seconds]
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+# Add the api directory to the path so we can import the service
+sys.path.append(os.path.join(os.path.dirname(__file__), 'api'))
+
+from app.services.adk import ADKClient
+from app.services.llm_limiter import AdaptiveLimiter
+from app.core.config import settings
+
+
+class _FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class SimulatedModel:
+    """Stands in for genai.GenerativeModel with a fixed response latency."""
+
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def generate_content_async(self, prompt: str) -> _FakeResponse:
+        if self.blocking:
+            # Mimics the old behaviour of calling the sync client on the loop
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        return _FakeResponse('{"recommendation": "ok"}')
+
+
+async def _heartbeat(stop: asyncio.Event, interval: float, stalls: list):
+    while not stop.is_set():
+        before = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - before - interval)
+
+
+async def run_case(client: ADKClient, concurrency: int) -> tuple:
+    stop = asyncio.Event()
+    stalls = []
+    heartbeat = asyncio.create_task(_heartbeat(stop, 0.01, stalls))
+
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client.run_agent(
+            agent_name="benchmark",
+            data={"prompt": f"request {i}"},
+            user_id="bench_user",
+            session_id=f"bench_session_{i}",
+            instruction="Return JSON."
+        )
+        for i in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await heartbeat
+    return elapsed, max(stalls, default=0.0)
+
+
+async def main(concurrency: int, latency: float):
+    # Route run_agent through the direct Gemini path so no credentials are needed
+    settings.GOOGLE_GENAI_USE_VERTEX = False
+    client = ADKClient()
+    # Measure the event loop, not the limiter: let all N calls run at once
+    client.limiter = AdaptiveLimiter(initial_concurrency=concurrency, max_concurrency=concurrency)
+
+    print(f"Concurrency: {concurrency}, simulated model latency: {latency:.2f}s")
+    for label, blocking in (("blocking (old)", True), ("non-blocking", False)):
+        client.gemini_model = SimulatedModel(latency, blocking)
+        elapsed, max_stall = await run_case(client, concurrency)
+        print(
+            f"{label:>16}: wall {elapsed:6.2f}s | "
+            f"serial estimate {concurrency * latency:6.2f}s | "
+            f"max loop stall {max_stall * 1000:8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    asyncio.run(main(concurrency, latency))
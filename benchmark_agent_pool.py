@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-call LlmAgent/Runner construction cost vs. the ADKClient runner pool.
+
+Builds the agent/runner pair that run_agent needs N times, first from scratch
+(the old behaviour) and then through ADKClient.get_runner, and reports the
+mean per-call overhead of each. No model calls are made.
+
+Usage: python benchmark_agent_pool.py [iterations]
+"""
+
+import sys
+import os
+import time
+
+# Add the api directory to the path so we can import the service
+sys.path.append(os.path.join(os.path.dirname(__file__), 'api'))
+
+from google.adk.agents import LlmAgent
+from google.adk.runners import Runner
+from google.adk.tools import google_search
+from app.services.adk import ADKClient
+
+# Mirrors the configurations the audit and explanation sub-agents use
+AGENT_CONFIGS = [
+    ("compliance_scanner", "You are an AI Compliance Analyst. Follow the prompt and return only the requested JSON."),
+    ("remediation_suggestor", "You are an AI Remediation Specialist. Follow the prompt and return only the requested JSON."),
+    ("query_deconstructor", "Deconstruct the user's complex query into a list of simple, researchable questions."),
+    ("synthesizer", "Synthesize the research findings into a single, clear answer to the user's original question."),
+]
+
+
+def build_fresh(client: ADKClient, agent_name: str, instruction: str, tools: list) -> Runner:
+    agent = LlmAgent(name=agent_name, model=client.model, instruction=instruction, tools=tools)
+    return Runner(agent=agent, app_name=client.app_name, session_service=client.session_service)
+
+
+def time_per_call(label: str, build, client: ADKClient, iterations: int) -> float:
+    tools = [google_search]
+    start = time.perf_counter()
+    for i in range(iterations):
+        agent_name, instruction = AGENT_CONFIGS[i % len(AGENT_CONFIGS)]
+        build(client, agent_name, instruction, tools)
+    per_call = (time.perf_counter() - start) / iterations
+    print(f"{label:>10}: {per_call * 1e6:10.1f} us/call")
+    return per_call
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    client = ADKClient()
+
+    print(f"Iterations: {iterations}")
+    fresh = time_per_call("fresh", build_fresh, client, iterations)
+    pooled = time_per_call("pooled", lambda c, n, i, t: c.get_runner(n, i, t), client, iterations)
+    print(f"Speed-up: {fresh / pooled:.1f}x | pool: {client.runner_pool_stats()}")
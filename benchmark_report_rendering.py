@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark: PDF report render time against issue count.
+
+Renders synthetic audit reports with 10 to 400 issues and reports, per size:
+  cold    - a fresh stylesheet per report (the previous behaviour)
+  cached  - the stylesheet built once per process
+  pool    - `concurrency` reports at once through the render process pool,
+            reported as wall time per report
+
+Imports app.services.pdf_tools, so it needs the API's dependencies for that module
+(ReportLab, PyPDF2, motor, python-dotenv and pydantic-settings for the app config), but
+no running database or model backend.
+
+Usage: python benchmark_report_rendering.py [rounds] [concurrency]
+"""
+
+import sys
+import os
+import time
+import asyncio
+
+# Add the api directory to the path so we can import the service
+sys.path.append(os.path.join(os.path.dirname(__file__), 'api'))
+
+from app.services import pdf_tools
+from app.services.pdf_tools import render_pdf_report, render_pdf_report_async, shutdown_render_pool
+
+ISSUE_COUNTS = [10, 50, 100, 200, 400]
+SEVERITIES = ["High", "Medium", "Low"]
+
+
+def make_report(issue_count: int) -> dict:
+    issues = [
+        {
+            "description": f"Control gap #{i}: access reviews are not performed on a defined schedule.",
+            "severity": SEVERITIES[i % len(SEVERITIES)],
+            "recommendation": "Define a quarterly access review.\nRecord reviewer, date and outcome.\nRevoke stale access within 5 days.",
+        }
+        for i in range(issue_count)
+    ]
+    sections = [
+        {"title": f"Finding {i + 1}", "content": issue["description"], "flagged": True}
+        for i, issue in enumerate(issues)
+    ]
+    return {"sections": sections, "score": 62, "issues": issues, "overall_severity": "High"}
+
+
+def render_sync(report: dict, cold: bool) -> float:
+    if cold:
+        pdf_tools._report_styles = None
+    start = time.perf_counter()
+    render_pdf_report(report["sections"], report["score"], report["issues"], report["overall_severity"])
+    return time.perf_counter() - start
+
+
+async def render_pool(report: dict, concurrency: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        render_pdf_report_async(report["sections"], report["score"], report["issues"], report["overall_severity"])
+        for _ in range(concurrency)
+    ])
+    return (time.perf_counter() - start) / concurrency
+
+
+async def main(rounds: int, concurrency: int):
+    print(f"Render workers: {pdf_tools.settings.PDF_RENDER_WORKERS} | rounds: {rounds} | concurrency: {concurrency}")
+    print(f"{'issues':>6} {'cold':>9} {'cached':>9} {'pool':>9}")
+    # Warm up the pool so worker start-up is not counted
+    await render_pool(make_report(1), concurrency)
+    try:
+        for count in ISSUE_COUNTS:
+            report = make_report(count)
+            cold = sum(render_sync(report, cold=True) for _ in range(rounds)) / rounds
+            cached = sum(render_sync(report, cold=False) for _ in range(rounds)) / rounds
+            pooled = 0.0
+            for _ in range(rounds):
+                pooled += await render_pool(report, concurrency)
+            pooled /= rounds
+            print(f"{count:>6} {cold * 1000:>7.1f}ms {cached * 1000:>7.1f}ms {pooled * 1000:>7.1f}ms")
+    finally:
+        shutdown_render_pool()
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    asyncio.run(main(rounds, concurrency))
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ComplianceScannerAgent in tool, inline and retrieval mode on the bundled sample documents.
+
+Uploads the sample_*.txt documents to GridFS (extracting their text at upload), then runs
+the scanner repeatedly in each mode and reports the mean wall time per scan. Tool mode
+fetches the documents through get_document_content calls; inline mode embeds the text up
+front; retrieval mode embeds only the top BM25 passages per control family.
+
+Uses the synthetic LLM backend unless LLM_BACKEND is already set, so only MongoDB is required.
+With the synthetic backend the numbers reflect prompt size and model turns under its cost
+model (sampled latency per turn, one extra turn for tool mode's parallel function calls),
+not a live model's prefill or tool-calling behaviour; record cassettes or run against a
+live backend for those.
+
+Usage: python benchmark_scanner_modes.py [rounds]
+"""
+
+import sys
+import os
+import glob
+import time
+import asyncio
+
+os.environ.setdefault("LLM_BACKEND", "synthetic")
+
+# Add the api directory to the path so we can import the service
+sys.path.append(os.path.join(os.path.dirname(__file__), 'api'))
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from app.core.config import settings
+from app.infrastructure.db import mongodb
+from app.services.adk import ADKClient
+from app.services.vertex_ai import VertexAIClient
+from app.services.pdf_tools import save_document_with_extraction
+from app.agents.sub_agents.compliance_scanner import ComplianceScannerAgent
+
+CONTROL_FAMILIES = ["Access Control", "Incident Response", "Data Protection", "Secure Development"]
+
+
+async def scan(scanner: ComplianceScannerAgent, doc_ids: list, mode: str) -> int:
+    issues = 0
+    async for issue in scanner.stream_issues(
+        audit_type="Benchmark",
+        company_name="Benchmark Corp",
+        audit_scope="Sample policies",
+        control_families=CONTROL_FAMILIES,
+        doc_ids=doc_ids,
+        user_id="bench_user",
+        session_id="bench_session",
+        scan_mode=mode
+    ):
+        if "error" not in issue:
+            issues += 1
+    return issues
+
+
+async def main(rounds: int):
+    mongodb.client = AsyncIOMotorClient(settings.MONGODB_URL)
+    mongodb.db = mongodb.client[settings.DATABASE_NAME]
+
+    paths = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_*.txt")))
+    doc_ids = []
+    try:
+        for path in paths:
+            with open(path, "rb") as f:
+                doc_ids.append(await save_document_with_extraction(
+                    mongodb.db, f, os.path.basename(path), {"user_id": "bench_user", "type": "benchmark"}
+                ))
+        total_chars = sum(os.path.getsize(path) for path in paths)
+
+        scanner = ComplianceScannerAgent(VertexAIClient(), ADKClient())
+        print(f"Backend: {settings.LLM_BACKEND} | documents: {len(paths)} (~{total_chars // 4} tokens) | rounds: {rounds}")
+        for mode in ("tool", "inline", "retrieval"):
+            start = time.perf_counter()
+            issues = 0
+            for _ in range(rounds):
+                issues = await scan(scanner, doc_ids, mode)
+            per_scan = (time.perf_counter() - start) / rounds
+            print(f"{mode:>9}: {per_scan:6.2f}s per scan | {issues} issues")
+    finally:
+        fs = AsyncIOMotorGridFSBucket(mongodb.db)
+        for doc_id in doc_ids:
+            await fs.delete(ObjectId(doc_id))
+        mongodb.client.close()
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    asyncio.run(main(rounds))
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Re-renders stored audit reports, e.g. after a layout change in build_report_story /
+render_pdf_report (bump REPORT_LAYOUT_VERSION with it).
+
+Streams audits from the `audits` collection in _id order and re-renders only the reports
+that exist and are stale: a cached rendering for another result or layout version, or a PDF
+rendered during the audit (pdf_id). Audits never rendered in this format are skipped; they
+are rendered with the current layout on their first request. A PDF rendered during the audit
+is replaced by a new file: the audit's pdf_id and pdf_url move to it in one update before the
+old file is deleted, and links to the old id keep resolving through the audit.
+
+PDFs are rendered across a process pool, other formats in-process. Each report is uploaded as
+soon as it is rendered. Progress is checkpointed in Mongo after every batch, so an interrupted
+run picks up where it stopped. --restart ignores the checkpoint; since current reports are
+skipped, it also cheaply retries the audits that failed in an earlier pass.
+
+Audits from before structured results were stored (legacy entries) have nothing to
+re-render from and are left alone.
+
+Usage: python regenerate_reports.py [--format pdf] [--workers N] [--batch-size N]
+                                    [--user-id ID] [--project-id ID] [--limit N] [--force] [--restart]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+# Add the api directory to the path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'api'))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.core.config import settings
+from app.infrastructure.db import mongodb
+from app.services.pdf_tools import render_pdf_report
+from app.services.report_store import report_store
+from app.agents.sub_agents.report_generator import ReportGeneratorAgent, REPORT_FORMATS, REPORT_LAYOUT_VERSION
+
+
+class Totals:
+    def __init__(self):
+        self.scanned = 0
+        self.current = 0
+        self.unrendered = 0
+        self.rendered = 0
+        self.failed = 0
+        self.bytes = 0
+        self.render_seconds = 0.0
+        self.upload_seconds = 0.0
+
+    def as_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    def load(self, data: dict):
+        for key, value in data.items():
+            if hasattr(self, key):
+                setattr(self, key, value)
+
+
+async def rendered_reports(audits: list, report_format: str) -> tuple:
+    """
+    Ids of the audits that have a rendering in `report_format`, and of those whose rendering
+    matches their result and the current layout.
+    """
+    cursor = mongodb.db.fs.files.find(
+        {
+            "metadata.audit_id": {"$in": [str(audit["_id"]) for audit in audits]},
+            "metadata.format": report_format,
+        },
+        {"metadata.audit_id": 1, "metadata.result_version": 1, "metadata.layout_version": 1}
+    )
+    versions = {str(audit["_id"]): audit.get("result_version") for audit in audits}
+    # PDFs rendered during the audit before they were tagged with it
+    rendered = {str(audit["_id"]) for audit in audits if report_format == "pdf" and audit.get("pdf_id")}
+    current = set()
+    async for file_doc in cursor:
+        metadata = file_doc["metadata"]
+        rendered.add(metadata["audit_id"])
+        if versions.get(metadata["audit_id"]) == metadata.get("result_version") and metadata.get("layout_version") == REPORT_LAYOUT_VERSION:
+            current.add(metadata["audit_id"])
+    return rendered, current
+
+
+async def render(pool: ProcessPoolExecutor, reporter: ReportGeneratorAgent, audit: dict, report_format: str) -> bytes:
+    if report_format != "pdf":
+        return await reporter.render(audit, report_format)
+    issues = audit.get("issues") or []
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        pool, render_pdf_report,
+        reporter.build_sections(issues), audit.get("score"), issues, audit.get("overall_severity", "None")
+    )
+
+
+async def regenerate_one(pool, reporter, audit: dict, report_format: str, upload_slots: asyncio.Semaphore, totals: Totals):
+    audit_id = str(audit["_id"])
+    try:
+        started = time.perf_counter()
+        data = await render(pool, reporter, audit, report_format)
+        totals.render_seconds += time.perf_counter() - started
+
+        async with upload_slots:
+            started = time.perf_counter()
+            await report_store.store(
+                audit, report_format, REPORT_LAYOUT_VERSION, f"audit_report_{audit_id}.{REPORT_FORMATS[report_format][1]}", data,
+                # Replace a PDF rendered during the audit; the audit is re-pointed at the new file
+                replace_id=audit.get("pdf_id") if report_format == "pdf" else None
+            )
+            totals.upload_seconds += time.perf_counter() - started
+        totals.rendered += 1
+        totals.bytes += len(data)
+    except Exception as e:
+        totals.failed += 1
+        print(f"❌ Audit {audit_id}: {e}")
+
+
+async def process_batch(pool, reporter, audits: list, report_format: str, force: bool, upload_slots: asyncio.Semaphore, totals: Totals):
+    totals.scanned += len(audits)
+    rendered, current = await rendered_reports(audits, report_format)
+    if force:
+        current = set()
+    totals.unrendered += len(audits) - len(rendered)
+    totals.current += len(current & rendered)
+    pending = [audit for audit in audits if str(audit["_id"]) in rendered and str(audit["_id"]) not in current]
+    await asyncio.gather(*[
+        regenerate_one(pool, reporter, audit, report_format, upload_slots, totals) for audit in pending
+    ])
+
+
+def print_progress(totals: Totals, rendered: int, elapsed: float):
+    rate = rendered / elapsed if elapsed else 0.0
+    print(f"  {totals.scanned} scanned | {totals.rendered} rendered | {totals.current} current | {totals.unrendered} never rendered | {totals.failed} failed | {rate:.1f} reports/s")
+
+
+def print_summary(totals: Totals, baseline: dict, elapsed: float, workers: int):
+    # Throughput covers this run only; the counts include runs resumed from
+    rendered = totals.rendered - baseline["rendered"]
+    rate = rendered / elapsed if elapsed else 0.0
+    run_megabytes = (totals.bytes - baseline["bytes"]) / (1024 * 1024)
+    megabytes = totals.bytes / (1024 * 1024)
+    print("\n📊 Regeneration summary")
+    print(f"  Audits scanned:      {totals.scanned}")
+    print(f"  Reports rendered:    {totals.rendered} ({megabytes:.1f} MB)")
+    print(f"  Already current:     {totals.current}")
+    print(f"  Never rendered:      {totals.unrendered} (rendered on first request)")
+    print(f"  Failed:              {totals.failed}")
+    print(f"  Wall time:           {elapsed:.1f}s with {workers} render workers")
+    print(f"  Throughput:          {rendered} reports this run, {rate:.1f} reports/s, {run_megabytes / elapsed if elapsed else 0.0:.2f} MB/s")
+    if totals.rendered:
+        print(f"  Mean latency:        {totals.render_seconds / totals.rendered * 1000:.0f}ms / {totals.upload_seconds / totals.rendered * 1000:.0f}ms per report (render / upload, incl. queueing)")
+
+
+async def save_checkpoint(checkpoints, checkpoint_id: str, last_audit_id, totals: Totals):
+    await checkpoints.update_one(
+        {"_id": checkpoint_id},
+        {"$set": {"last_audit_id": last_audit_id, "totals": totals.as_dict(), "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+async def regenerate_reports(args):
+    client = AsyncIOMotorClient(settings.MONGODB_URL)
+    mongodb.client = client
+    mongodb.db = client[settings.DATABASE_NAME]
+    checkpoints = mongodb.db.report_regenerations
+    # A layout change starts a fresh pass; the same layout resumes
+    scope = f"{args.user_id or '*'}:{args.project_id or '*'}"
+    checkpoint_id = f"{args.format}:{REPORT_LAYOUT_VERSION}:{scope}"
+
+    query = {"legacy": {"$ne": True}}
+    if args.user_id:
+        query["user_id"] = args.user_id
+    if args.project_id:
+        query["project_id"] = args.project_id
+
+    totals = Totals()
+    if args.restart:
+        await checkpoints.delete_one({"_id": checkpoint_id})
+    else:
+        checkpoint = await checkpoints.find_one({"_id": checkpoint_id})
+        if checkpoint:
+            query["_id"] = {"$gt": checkpoint["last_audit_id"]}
+            totals.load(checkpoint.get("totals", {}))
+            print(f"↩️  Resuming after audit {checkpoint['last_audit_id']} ({totals.scanned} already scanned)")
+
+    workers = args.workers or os.cpu_count() or 1
+    # Spawn rather than fork: the parent runs an event loop and driver threads
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    reporter = ReportGeneratorAgent()
+    upload_slots = asyncio.Semaphore(max(1, args.upload_concurrency))
+    baseline = totals.as_dict()
+    started = time.perf_counter()
+    print(f"🔄 Regenerating {args.format} reports (layout {REPORT_LAYOUT_VERSION}) with {workers} workers, batches of {args.batch_size}")
+
+    try:
+        cursor = mongodb.db.audits.find(query, {"timings": 0, "models": 0}).sort("_id", 1).batch_size(args.batch_size)
+        if args.limit:
+            cursor = cursor.limit(args.limit)
+        batch = []
+        async for audit in cursor:
+            batch.append(audit)
+            if len(batch) < args.batch_size:
+                continue
+            await process_batch(pool, reporter, batch, args.format, args.force, upload_slots, totals)
+            await save_checkpoint(checkpoints, checkpoint_id, batch[-1]["_id"], totals)
+            print_progress(totals, totals.rendered - baseline["rendered"], time.perf_counter() - started)
+            batch = []
+        if batch:
+            await process_batch(pool, reporter, batch, args.format, args.force, upload_slots, totals)
+            await save_checkpoint(checkpoints, checkpoint_id, batch[-1]["_id"], totals)
+    finally:
+        pool.shutdown(cancel_futures=True)
+        client.close()
+
+    print_summary(totals, baseline, time.perf_counter() - started, workers)
+    return totals.failed == baseline["failed"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-render stored audit reports into the GridFS report cache.")
+    parser.add_argument("--format", choices=list(REPORT_FORMATS), default="pdf", help="Report format to regenerate (default: pdf)")
+    parser.add_argument("--workers", type=int, default=0, help="Render processes (default: one per CPU)")
+    parser.add_argument("--batch-size", type=int, default=200, help="Audits per batch and checkpoint (default: 200)")
+    parser.add_argument("--upload-concurrency", type=int, default=8, help="Concurrent GridFS uploads (default: 8)")
+    parser.add_argument("--user-id", help="Only audits of this user")
+    parser.add_argument("--project-id", help="Only audits of this project")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after this many audits")
+    parser.add_argument("--force", action="store_true", help="Re-render existing reports even if they are current")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint and start from the first audit")
+    args = parser.parse_args()
+    args.batch_size = max(1, args.batch_size)
+
+    ok = asyncio.run(regenerate_reports(args))
+    sys.exit(0 if ok else 1)